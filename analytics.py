@@ -0,0 +1,168 @@
+"""
+Аналитика модерации на основе почасовых агрегатов
+
+При каждом переходе вопроса (создание, принятие, отклонение, публикация) увеличиваются
+счётчики в таблицах hourly_rollups и latency_rollups. Отчёты строятся только по этим
+таблицам, поэтому их стоимость не зависит от количества вопросов в базе.
+"""
+import collections
+import datetime
+
+from peewee import chunked, fn
+
+from models import HourlyRollup, LatencyRollup, Question, db
+
+# Верхние границы интервалов гистограммы задержек, в секундах
+LATENCY_BUCKETS = (
+    60, 5 * 60, 15 * 60, 30 * 60,
+    3600, 2 * 3600, 4 * 3600, 8 * 3600, 12 * 3600,
+    86400, 2 * 86400, 4 * 86400, 7 * 86400, 14 * 86400, 30 * 86400,
+    float('inf'),
+)
+
+EVENTS = ('created', 'approved', 'rejected', 'published')
+METRICS = ('moderation', 'publish')
+
+
+def truncate_to_hour(moment: datetime.datetime) -> datetime.datetime:
+    """Начало часа, к которому относится момент времени"""
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def get_bucket(seconds: float) -> int:
+    """Номер интервала гистограммы для задержки"""
+    for index, upper_bound in enumerate(LATENCY_BUCKETS):
+        if seconds <= upper_bound:
+            return index
+    return len(LATENCY_BUCKETS) - 1
+
+
+def record_event(event: str, moment: datetime.datetime = None, count: int = 1):
+    """Увеличение почасового счётчика события"""
+    hour = truncate_to_hour(moment or datetime.datetime.now())
+    (HourlyRollup
+     .insert(hour=hour, event=event, count=count)
+     .on_conflict(conflict_target=[HourlyRollup.hour, HourlyRollup.event],
+                  update={HourlyRollup.count: HourlyRollup.count + count})
+     .execute())
+
+
+def record_latency(metric: str, seconds: float, moment: datetime.datetime = None, count: int = 1):
+    """Добавление задержки в почасовую гистограмму"""
+    hour = truncate_to_hour(moment or datetime.datetime.now())
+    bucket = get_bucket(max(seconds, 0))
+    (LatencyRollup
+     .insert(hour=hour, metric=metric, bucket=bucket, count=count)
+     .on_conflict(conflict_target=[LatencyRollup.hour, LatencyRollup.metric, LatencyRollup.bucket],
+                  update={LatencyRollup.count: LatencyRollup.count + count})
+     .execute())
+
+
+def record_transition(event: str, created_at: datetime.datetime, moment: datetime.datetime):
+    """
+    Учёт перехода вопроса: approved/rejected — время модерации,
+    published — время от создания до публикации
+    """
+    with db.atomic('IMMEDIATE'):
+        record_event(event, moment)
+        if event in ('approved', 'rejected'):
+            record_latency('moderation', (moment - created_at).total_seconds(), moment)
+        elif event == 'published':
+            record_latency('publish', (moment - created_at).total_seconds(), moment)
+
+
+def percentile(histogram: dict[int, int], q: float):
+    """
+    Перцентиль по гистограмме — верхняя граница интервала, в котором он находится
+    Возвращает None, если гистограмма пуста
+    """
+    total = sum(histogram.values())
+    if not total:
+        return None
+
+    threshold = total * q
+    cumulative = 0
+    for bucket in sorted(histogram):
+        cumulative += histogram[bucket]
+        if cumulative >= threshold:
+            return LATENCY_BUCKETS[bucket]
+    return LATENCY_BUCKETS[-1]
+
+
+def get_report(days: int = 30) -> dict:
+    """Отчёт за последние days дней: объём по дням и перцентили задержек"""
+    since = truncate_to_hour(datetime.datetime.now()) - datetime.timedelta(days=days)
+
+    daily = {}
+    day = fn.date(HourlyRollup.hour).coerce(False)
+    query = (HourlyRollup
+             .select(day.alias('day'), HourlyRollup.event, fn.SUM(HourlyRollup.count))
+             .where(HourlyRollup.hour >= since)
+             .group_by(day, HourlyRollup.event)
+             .order_by(day)
+             .tuples())
+    for day_value, event, count in query:
+        daily.setdefault(day_value, dict.fromkeys(EVENTS, 0))[event] = count
+
+    histograms = {metric: {} for metric in METRICS}
+    query = (LatencyRollup
+             .select(LatencyRollup.metric, LatencyRollup.bucket, fn.SUM(LatencyRollup.count))
+             .where(LatencyRollup.hour >= since)
+             .group_by(LatencyRollup.metric, LatencyRollup.bucket)
+             .tuples())
+    for metric, bucket, count in query:
+        histograms.setdefault(metric, {})[bucket] = count
+
+    latency = {
+        metric: {
+            'count': sum(histogram.values()),
+            'p50': percentile(histogram, 0.50),
+            'p90': percentile(histogram, 0.90),
+            'p99': percentile(histogram, 0.99),
+        }
+        for metric, histogram in histograms.items()
+    }
+
+    return {'daily': daily, 'latency': latency}
+
+
+def rebuild():
+    """
+    Пересчёт агрегатов по всей таблице вопросов (для данных, созданных до появления аналитики)
+    Счётчики накапливаются в памяти (их не больше, чем часов в истории) и записываются пакетно
+    Чтение и запись идут в одной транзакции BEGIN IMMEDIATE: события, которые работающий бот
+    записал бы во время чтения, иначе были бы стёрты. Запись бота ждёт окончания пересчёта
+    """
+    events = collections.Counter()
+    latencies = collections.Counter()
+
+    with db.atomic('IMMEDIATE'):
+        query = (Question
+                 .select(Question.status, Question.created_at, Question.moderated_at, Question.published_at)
+                 .tuples()
+                 .iterator())
+        for status, created_at, moderated_at, published_at in query:
+            events[(truncate_to_hour(created_at), 'created')] += 1
+            if moderated_at and status in ('approved', 'rejected'):
+                hour = truncate_to_hour(moderated_at)
+                events[(hour, status)] += 1
+                latencies[(hour, 'moderation', get_bucket(max((moderated_at - created_at).total_seconds(), 0)))] += 1
+            if published_at:
+                hour = truncate_to_hour(published_at)
+                events[(hour, 'published')] += 1
+                latencies[(hour, 'publish', get_bucket(max((published_at - created_at).total_seconds(), 0)))] += 1
+
+        HourlyRollup.delete().execute()
+        LatencyRollup.delete().execute()
+
+        for batch in chunked(events.items(), 500):
+            HourlyRollup.insert_many(
+                [(hour, event, count) for (hour, event), count in batch],
+                fields=[HourlyRollup.hour, HourlyRollup.event, HourlyRollup.count]
+            ).execute()
+
+        for batch in chunked(latencies.items(), 500):
+            LatencyRollup.insert_many(
+                [(hour, metric, bucket, count) for (hour, metric, bucket), count in batch],
+                fields=[LatencyRollup.hour, LatencyRollup.metric, LatencyRollup.bucket, LatencyRollup.count]
+            ).execute()
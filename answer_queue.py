@@ -0,0 +1,113 @@
+"""
+Очередь ответов администратора
+
+Каждый принятый вопрос ставится в конец очереди администратора, который его принял.
+Очередное видеосообщение (кружочек) считается ответом на вопрос в голове очереди.
+Очередь хранится в базе данных, поэтому переживает перезапуск бота.
+"""
+from peewee import fn
+
+from models import AnswerQueue, Question, db
+
+
+def enqueue(admin_id: int, question_id: str) -> int:
+    """
+    Постановка вопроса в конец очереди администратора
+    Возвращает номер вопроса в очереди (начиная с 1)
+    """
+    with db.atomic('IMMEDIATE'):
+        entry = AnswerQueue.get_or_none(AnswerQueue.question == question_id)
+        if entry is None:
+            last_position = (AnswerQueue
+                             .select(fn.MAX(AnswerQueue.position))
+                             .where(AnswerQueue.admin_id == admin_id)
+                             .scalar())
+            entry = AnswerQueue.create(
+                admin_id=admin_id,
+                question=question_id,
+                position=(last_position or 0) + 1
+            )
+
+        return (AnswerQueue
+                .select()
+                .where((AnswerQueue.admin_id == entry.admin_id) &
+                       (AnswerQueue.position <= entry.position))
+                .count())
+
+
+def get_head(admin_id: int):
+    """Первый вопрос в очереди администратора (или None, если очередь пуста)"""
+    return (AnswerQueue
+            .select(AnswerQueue, Question)
+            .join(Question)
+            .where(AnswerQueue.admin_id == admin_id)
+            .order_by(AnswerQueue.position)
+            .first())
+
+
+def get_entries(admin_id: int, limit: int = 10) -> list:
+    """Первые вопросы в очереди администратора в порядке ответа"""
+    return list(AnswerQueue
+                .select(AnswerQueue, Question)
+                .join(Question)
+                .where(AnswerQueue.admin_id == admin_id)
+                .order_by(AnswerQueue.position)
+                .limit(limit))
+
+
+def get_size(admin_id: int) -> int:
+    """
+    Количество вопросов в очереди администратора
+    Записи удалённых вопросов не учитываются — так же, как в get_head
+    """
+    return (AnswerQueue
+            .select()
+            .join(Question)
+            .where(AnswerQueue.admin_id == admin_id)
+            .count())
+
+
+def skip_head(admin_id: int) -> bool:
+    """Перемещение первого вопроса очереди в её конец"""
+    with db.atomic('IMMEDIATE'):
+        head = get_head(admin_id)
+        if head is None:
+            return False
+
+        last_position = (AnswerQueue
+                         .select(fn.MAX(AnswerQueue.position))
+                         .where(AnswerQueue.admin_id == admin_id)
+                         .scalar())
+        if last_position == head.position:
+            return False
+
+        head.position = last_position + 1
+        head.save()
+        return True
+
+
+def move_to_front(admin_id: int, question_id: str) -> bool:
+    """Перемещение вопроса в начало очереди администратора"""
+    with db.atomic('IMMEDIATE'):
+        entry = AnswerQueue.get_or_none(
+            (AnswerQueue.admin_id == admin_id) &
+            (AnswerQueue.question == question_id)
+        )
+        if entry is None:
+            return False
+
+        first_position = (AnswerQueue
+                          .select(fn.MIN(AnswerQueue.position))
+                          .where(AnswerQueue.admin_id == admin_id)
+                          .scalar())
+        if first_position == entry.position:
+            return True
+
+        entry.position = first_position - 1
+        entry.save()
+        return True
+
+
+def remove(question_id: str):
+    """Удаление вопроса из очереди (после публикации ответа)"""
+    AnswerQueue.delete().where(AnswerQueue.question == question_id).execute()
@@ -1,9 +1,13 @@
 #!/usr/bin/env python3
 """
 Скрипт для резервного копирования базы данных
+
+База работает в режиме WAL, поэтому часть изменений может находиться в файле
+questions.db-wal. Копия создаётся через backup API SQLite, а не копированием файла,
+и остаётся согласованной даже во время работы бота.
 """
 import os
-import shutil
+import sqlite3
 from datetime import datetime
 
 from loguru import logger
@@ -31,8 +35,16 @@ def create_backup():
     backup_path = os.path.join(BACKUP_DIR, backup_filename)
 
     try:
-        # Копирование файла базы данных
-        shutil.copy2(DB_FILE, backup_path)
+        # Согласованный снимок базы вместе с незавершёнными в WAL изменениями
+        source = sqlite3.connect(DB_FILE)
+        target = sqlite3.connect(backup_path)
+        try:
+            with target:
+                source.backup(target)
+        finally:
+            target.close()
+            source.close()
+
         file_size = os.path.getsize(backup_path)
         logger.info(f"✅ Резервная копия создана успешно:")
         logger.info(f"   Файл: {backup_path}")
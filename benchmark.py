@@ -0,0 +1,610 @@
+#!/usr/bin/env python3
+"""
+Воспроизводимые бенчмарки слоя данных и обработчиков бота
+
+Бенчмарки выполняются на временной базе, заполненной синтетическими вопросами
+(генератор детерминирован: одинаковые параметры дают одинаковые данные).
+Обработчики bot.py вызываются через диспетчер с заглушкой вместо Telegram API.
+"""
+import asyncio
+import builtins
+import contextlib
+import datetime
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+# Тестовая конфигурация: бенчмарки не обращаются к Telegram
+os.environ.setdefault('BOT_TOKEN', '123456:BENCHMARK-TOKEN-AAAAAAAAAAAAAAAAAAAAAAAAA')
+os.environ.setdefault('ADMIN_ID', '100000001')
+os.environ.setdefault('CHANNEL_ID', '@benchmark_channel')
+
+from aiogram import Bot
+from aiogram.types import CallbackQuery, Chat, Message, Update, User, VideoNote
+from loguru import logger
+from peewee import SQL, chunked
+
+import analytics
+import db_utils
+from models import Question, db, init_db, close_db
+
+SEED = 42
+
+# ID обновлений растут между запусками: журнал обновлений отбрасывает повторные ID
+_update_ids = itertools.count(1)
+_message_ids = itertools.count(1)
+
+# Фрагменты для генерации правдоподобных вопросов
+QUESTION_STARTS = (
+    "Здравствуйте!", "Добрый день.", "Подскажите, пожалуйста,", "Доктор, вопрос:",
+    "Уже полгода мучаюсь:", "Посоветуйте,", "Интересует такой момент:", "",
+)
+QUESTION_TOPICS = (
+    "как избавиться от постакне на щеках", "можно ли делать массаж лица при куперозе",
+    "через сколько после ботокса можно в баню", "какой пилинг подойдёт для чувствительной кожи",
+    "помогает ли LPG-массаж при целлюлите", "как ухаживать за кожей после лазерной шлифовки",
+    "что делать с пигментными пятнами после лета", "во сколько лет начинать биоревитализацию",
+    "сколько процедур антицеллюлитного массажа нужно для результата",
+    "можно ли совмещать мезотерапию и чистку лица", "почему после умывания стягивает кожу",
+    "как убрать отёки под глазами по утрам", "поможет ли массаж при остеохондрозе шеи",
+    "какой крем с SPF выбрать для жирной кожи", "можно ли делать контурную пластику губ при герпесе",
+)
+QUESTION_DETAILS = (
+    "Кожа комбинированная, склонная к высыпаниям.", "Мне 34 года.", "Раньше процедуры не делала.",
+    "Аллергии нет.", "Пробовала разные кремы, не помогает.", "Беременность исключена.",
+    "Работаю за компьютером весь день.", "",
+)
+STATUS_WEIGHTS = (('pending', 15), ('approved', 55), ('rejected', 30))
+
+
+def generate_questions(count, seed=SEED, start=None):
+    """Детерминированный генератор синтетических вопросов (строки для executemany)"""
+    rng = random.Random(seed)
+    start = start or datetime.datetime(2025, 1, 1)
+    span = 365 * 86400
+    statuses = [status for status, weight in STATUS_WEIGHTS for _ in range(weight)]
+    moderator_ids = (100000001, 100000002, 100000003)
+    users = max(1, count // 3)  # В среднем три вопроса на пользователя
+
+    for _ in range(count):
+        text = " ".join(part for part in (
+            rng.choice(QUESTION_STARTS),
+            rng.choice(QUESTION_TOPICS) + "?",
+            rng.choice(QUESTION_DETAILS),
+        ) if part)
+        status = rng.choice(statuses)
+        created_at = start + datetime.timedelta(seconds=rng.randrange(span))
+        moderated_at = published_at = video_file_id = video_unique_id = None
+        if status != 'pending':
+            moderated_at = created_at + datetime.timedelta(seconds=int(rng.expovariate(1 / 7200)))
+        if status == 'approved' and rng.random() < 0.9:
+            published_at = moderated_at + datetime.timedelta(seconds=int(rng.expovariate(1 / 86400)))
+            video_file_id = f"DQACAgIAAxkBAAI{rng.getrandbits(64):016x}"
+            video_unique_id = f"AgAD{video_file_id[-16:]}"
+
+        yield (
+            str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            text,
+            status,
+            video_file_id,
+            str(created_at),
+            rng.choice(moderator_ids),
+            str(moderated_at) if moderated_at else None,
+            str(published_at) if published_at else None,
+            user_hash(rng.randrange(users)),
+            video_unique_id,
+        )
+
+
+def user_hash(user_number):
+    """Хеш синтетического пользователя (той же длины, что и utils.hash_user_id)"""
+    return f"{user_number:032x}"
+
+
+def populate(count, seed=SEED):
+    """Заполнение базы синтетическими вопросами"""
+    sql = db_utils.build_insert_sql()
+    for batch in chunked(generate_questions(count, seed), 50000):
+        with db.atomic():
+            db.cursor().executemany(sql, batch)
+
+
+def sample_ids(count, seed=SEED):
+    """Случайная выборка существующих ID вопросов (по rowid, без сканирования таблицы)"""
+    rng = random.Random(seed)
+    max_rowid = Question.select(SQL('MAX(rowid)')).scalar() or 0
+    ids = []
+    while max_rowid and len(ids) < count:
+        question_id = Question.select(Question.id).where(SQL('rowid') == rng.randint(1, max_rowid)).scalar()
+        if question_id:
+            ids.append(question_id)
+    return ids
+
+
+# ============== БЕНЧМАРКИ ==============
+
+def bench_insert(ctx):
+    """Вставка вопросов по одному (как в handle_question)"""
+    rows = list(generate_questions(ctx['ops'], seed=ctx['seed'] + 1))
+    for row in rows:
+        Question.create(**dict(zip(db_utils.EXPORT_FIELDS, row)))
+    return len(rows)
+
+
+def bench_bulk_insert(ctx):
+    """Пакетная вставка (как при импорте)"""
+    count = ctx['ops'] * 10
+    sql = db_utils.build_insert_sql()
+    with db.atomic():
+        db.cursor().executemany(sql, generate_questions(count, seed=ctx['seed'] + 2))
+    return count
+
+
+def bench_status_update(ctx):
+    """Смена статуса через compare-and-set (как в callback_approve)"""
+    for question_id in ctx['ids']:
+        (Question
+         .update(status='approved', moderated_at=datetime.datetime.now())
+         .where((Question.id == question_id) & (Question.status == 'pending'))
+         .execute())
+    return len(ctx['ids'])
+
+
+def bench_get_or_none(ctx):
+    """Поиск вопроса по ID"""
+    for question_id in ctx['ids']:
+        Question.get_or_none(Question.id == question_id)
+    return len(ctx['ids'])
+
+
+def bench_my_questions(ctx):
+    """Последние вопросы пользователя по хешу (команда /my)"""
+    for user_number in range(len(ctx['ids'])):
+        list(Question
+             .select(Question.text, Question.status, Question.created_at, Question.published_at)
+             .where(Question.user_hash == user_hash(user_number))
+             .order_by(Question.created_at.desc())
+             .limit(10))
+    return len(ctx['ids'])
+
+
+def bench_stats(ctx):
+    """Статистика (db_utils stats)"""
+    for _ in range(5):
+        db_utils.show_stats()
+    return 5
+
+
+def bench_list(ctx):
+    """Список последних вопросов по статусу (db_utils list)"""
+    for status in ('pending', 'approved', 'rejected', None):
+        db_utils.list_questions(status, 20)
+    return 4
+
+
+def bench_export(ctx):
+    """Экспорт всей базы в JSONL (db_utils export)"""
+    filename = os.path.join(ctx['tmpdir'], 'export.jsonl')
+    db_utils.export_questions(filename)
+    return ctx['rows']
+
+
+def bench_analytics(ctx):
+    """Отчёт по почасовым агрегатам (db_utils analytics)"""
+    for _ in range(5):
+        analytics.get_report(30)
+    return 5
+
+
+def bench_cleanup(ctx):
+    """Удаление старых отклонённых вопросов (db_utils clear)"""
+    before = Question.select().count()
+    db_utils.clear_old_questions(30)
+    return max(before - Question.select().count(), 1)
+
+
+def bench_handlers(ctx):
+    """Полный цикл обработчиков: вопрос -> принятие -> видеоответ -> публикация"""
+    return asyncio.run(run_handler_round_trips(ctx['ops'] // 10 or 1))
+
+
+class StubBot(Bot):
+    """Бот, который отвечает на все запросы без обращения к Telegram"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.approved_callbacks = []
+
+    async def __call__(self, method, request_timeout=None):
+        # Кнопка «Принять» из уведомления модератору — для следующего шага цикла
+        markup = getattr(method, 'reply_markup', None)
+        if markup is not None and hasattr(markup, 'inline_keyboard'):
+            for button in itertools.chain.from_iterable(markup.inline_keyboard):
+                if button.callback_data and button.callback_data.startswith('approve_'):
+                    self.approved_callbacks.append(button.callback_data)
+
+        if getattr(method, '__returning__', None) is Message:
+            chat_id = method.chat_id if isinstance(method.chat_id, int) else -1
+            return Message(message_id=next(_message_ids), date=datetime.datetime.now(),
+                           chat=Chat(id=chat_id, type='private'))
+        return True
+
+
+def message_update(user_id, **kwargs):
+    """Обновление с сообщением от пользователя"""
+    message = Message(message_id=next(_message_ids), date=datetime.datetime.now(),
+                      chat=Chat(id=user_id, type='private'),
+                      from_user=User(id=user_id, is_bot=False, first_name='Bench'), **kwargs)
+    return Update(update_id=next(_update_ids), message=message)
+
+
+def callback_update(user_id, data):
+    """Обновление с нажатием inline-кнопки"""
+    message = Message(message_id=next(_message_ids), date=datetime.datetime.now(),
+                      chat=Chat(id=user_id, type='private'), text='—')
+    callback = CallbackQuery(id=str(next(_message_ids)), chat_instance='bench', data=data, message=message,
+                             from_user=User(id=user_id, is_bot=False, first_name='Admin'))
+    return Update(update_id=next(_update_ids), callback_query=callback)
+
+
+async def run_handler_round_trips(count):
+    """Прогон обработчиков bot.py через диспетчер с заглушкой Telegram API"""
+    import bot as bot_module
+    from config import MODERATOR_IDS
+
+    stub = StubBot(token=os.environ['BOT_TOKEN'])
+    bot_module.bot = bot_module.notifier.bot = stub
+    dp = bot_module.dp
+    admin_id = MODERATOR_IDS[0]
+
+    for number in range(count):
+        user_id = 200000000 + number
+        await dp.feed_update(stub, message_update(user_id, text=f"Бенчмарк-вопрос {number}: как ухаживать за кожей?"))
+        await dp.feed_update(stub, callback_update(admin_id, stub.approved_callbacks.pop()))
+        await dp.feed_update(stub, message_update(
+            admin_id, video_note=VideoNote(file_id=f"video-{number}", file_unique_id=f"video-{number}",
+                                           length=240, duration=10)
+        ))
+
+    await stub.session.close()
+    return count
+
+
+BENCHMARKS = (
+    ('insert', bench_insert),
+    ('bulk_insert', bench_bulk_insert),
+    ('status_update', bench_status_update),
+    ('get_or_none', bench_get_or_none),
+    ('my_questions', bench_my_questions),
+    ('stats', bench_stats),
+    ('list', bench_list),
+    ('export', bench_export),
+    ('analytics', bench_analytics),
+    ('handlers', bench_handlers),
+    ('cleanup', bench_cleanup),
+)
+
+
+# ============== НАГРУЗОЧНЫЙ ТЕСТ МНОГОПРОЦЕССНОГО РЕЖИМА ==============
+
+def run_cluster_worker(index, workdir):
+    """Процесс-воркер bot.py с заглушкой Telegram API и базой во временном каталоге"""
+    os.environ['JOURNAL_FILE'] = os.path.join(workdir, 'updates.journal')
+    os.environ['CLUSTER_SOCKET_DIR'] = workdir
+    db.init(os.path.join(workdir, 'questions.db'))
+    logger.remove()
+
+    import bot as bot_module
+    bot_module.bot = bot_module.notifier.bot = StubBot(token=os.environ['BOT_TOKEN'])
+    asyncio.run(bot_module.main_worker(index))
+
+
+async def measure_cluster(workers, updates, workdir):
+    """Пропускная способность N воркеров: от отправки первого вопроса до сохранения последнего"""
+    import cluster
+
+    processes = [
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), 'cluster-worker', str(index), workdir],
+                         stdout=subprocess.DEVNULL)
+        for index in range(workers)
+    ]
+    connections = [cluster.WorkerConnection(index, cluster.get_socket_path(workdir, index))
+                   for index in range(workers)]
+    try:
+        for connection in connections:
+            connection.start()
+        await asyncio.gather(*(connection.wait_connected() for connection in connections))
+
+        started_at = time.perf_counter()
+        confirmations = []
+        for number in range(updates):
+            user_id = 300000000 + number
+            update = message_update(user_id, text=f"Нагрузочный вопрос {number}: можно ли делать массаж?")
+            confirmations.append(await connections[user_id % workers].send(update))
+        await asyncio.gather(*confirmations)
+
+        while Question.select().count() < updates:
+            await asyncio.sleep(0.01)
+        return time.perf_counter() - started_at
+
+    finally:
+        for connection in connections:
+            await connection.stop()
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+def run_cluster_benchmark(max_workers=4, updates=2000, output='benchmark_cluster.json'):
+    """Нагрузочный тест многопроцессного режима для 1, 2, 4, ... max_workers воркеров"""
+    tmpdir = tempfile.mkdtemp(prefix='marilav-cluster-')
+    counts = sorted({1, max_workers} | {2 ** power for power in range(1, max_workers.bit_length())
+                                        if 2 ** power <= max_workers})
+
+    logger.remove()
+    close_db()
+    original_database = db.database
+    results = {}
+    try:
+        for workers in counts:
+            workdir = os.path.join(tmpdir, f"workers-{workers}")
+            os.makedirs(workdir)
+            db.init(os.path.join(workdir, 'questions.db'))
+            with contextlib.redirect_stdout(io.StringIO()):
+                init_db()
+
+            elapsed = asyncio.run(measure_cluster(workers, updates, workdir))
+            close_db()
+
+            results[f"cluster_{workers}"] = {
+                'ops': updates,
+                'seconds': elapsed,
+                'ops_per_sec': updates / elapsed,
+                'timings': [elapsed],
+            }
+            speedup = results[f"cluster_{workers}"]['ops_per_sec'] / results['cluster_1']['ops_per_sec']
+            print(f"  воркеров: {workers:<3} {updates / elapsed:>10.0f} вопросов/с   ускорение x{speedup:.2f}")
+
+    finally:
+        close_db()
+        db.init(original_database)
+
+    report = {
+        'meta': {
+            'updates': updates,
+            'max_workers': max_workers,
+            'commit': get_git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        },
+        'results': results,
+    }
+
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"✅ Результаты сохранены: {output}")
+    return report
+
+
+# ============== ЗАПУСК И СРАВНЕНИЕ ==============
+
+def get_git_commit():
+    """Текущий коммит (для сопоставления результатов)"""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def run_benchmarks(rows=100000, output='benchmark_results.json', ops=1000, repeat=3, only=None):
+    """Запуск всех бенчмарков и сохранение результатов в JSON"""
+    tmpdir = tempfile.mkdtemp(prefix='marilav-bench-')
+    database_path = os.path.join(tmpdir, 'questions.db')
+
+    # Временная база вместо questions.db
+    close_db()
+    original_database = db.database
+    db.init(database_path)
+
+    # Логи обработчиков пишутся только в файл, без вывода в консоль
+    logger.remove()
+
+    results = {}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            init_db()
+
+        started_at = time.perf_counter()
+        populate(rows)
+        analytics.rebuild()
+        print(f"Сгенерировано {rows} вопросов за {time.perf_counter() - started_at:.1f} с")
+
+        ctx = {'rows': rows, 'ops': ops, 'seed': SEED, 'tmpdir': tmpdir}
+
+        for name, func in BENCHMARKS:
+            if only and name not in only:
+                continue
+
+            timings = []
+            for attempt in range(repeat):
+                ctx['ids'] = sample_ids(min(ops, rows), seed=SEED + attempt)
+                # Вывод db_utils и подтверждения удаления подавляются
+                with contextlib.redirect_stdout(io.StringIO()), \
+                        _patched_input('yes'), \
+                        db.atomic() as transaction:
+                    begin = time.perf_counter()
+                    count = func(ctx)
+                    timings.append(time.perf_counter() - begin)
+                    # База возвращается в исходное состояние для следующего повтора
+                    transaction.rollback()
+
+            best = min(timings)
+            results[name] = {
+                'ops': count,
+                'seconds': best,
+                'ops_per_sec': count / best if best else 0,
+                'timings': timings,
+            }
+            print(f"  {name:<15} {count:>9} оп. {best * 1000:>10.1f} мс {results[name]['ops_per_sec']:>12.0f} оп/с")
+
+    finally:
+        close_db()
+        db.init(original_database)
+
+    report = {
+        'meta': {
+            'rows': rows,
+            'ops': ops,
+            'repeat': repeat,
+            'seed': SEED,
+            'commit': get_git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        },
+        'results': results,
+    }
+
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"✅ Результаты сохранены: {output}")
+    return report
+
+
+@contextlib.contextmanager
+def _patched_input(answer):
+    """Автоматический ответ на запросы подтверждения db_utils"""
+    original_input = builtins.input
+    builtins.input = lambda prompt='': answer
+    try:
+        yield
+    finally:
+        builtins.input = original_input
+
+
+def compare_results(baseline_file, current_file, threshold=10.0):
+    """
+    Сравнение двух запусков; регрессия — падение оп/с больше чем на threshold процентов
+    Возвращает количество регрессий
+    """
+    with open(baseline_file, encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(current_file, encoding='utf-8') as f:
+        current = json.load(f)
+
+    print(f"\n{'=' * 72}")
+    print(f"Сравнение: {baseline_file} ({baseline['meta'].get('commit')}) -> "
+          f"{current_file} ({current['meta'].get('commit')})")
+    if baseline['meta'].get('rows') != current['meta'].get('rows'):
+        print("⚠️  Запуски выполнены на разном количестве строк")
+    print("=" * 72)
+    print(f"{'Бенчмарк':<15} {'Было, оп/с':>14} {'Стало, оп/с':>14} {'Изменение':>11}")
+
+    regressions = 0
+    for name, result in current['results'].items():
+        if name not in baseline['results']:
+            print(f"{name:<15} {'—':>14} {result['ops_per_sec']:>14.0f} {'новый':>11}")
+            continue
+
+        before = baseline['results'][name]['ops_per_sec']
+        after = result['ops_per_sec']
+        change = (after - before) / before * 100 if before else 0
+        flag = ''
+        if change < -threshold:
+            regressions += 1
+            flag = '  ❌ регрессия'
+        print(f"{name:<15} {before:>14.0f} {after:>14.0f} {change:>+10.1f}%{flag}")
+
+    print("=" * 72)
+    if regressions:
+        print(f"❌ Регрессий (хуже более чем на {threshold:g}%): {regressions}")
+    else:
+        print(f"✅ Регрессий нет (порог {threshold:g}%)")
+    return regressions
+
+
+def show_help():
+    """Показать справку по командам"""
+    help_text = """
+    Бенчмарки слоя данных и обработчиков бота
+
+    Использование: python benchmark.py <команда> [параметры]
+
+    Команды:
+        run [rows] [output] [names]    - Запустить бенчмарки
+                                         rows: количество вопросов в базе (по умолчанию 100000,
+                                               поддерживается до 10000000)
+                                         output: файл результатов (benchmark_results.json)
+                                         names: бенчмарки через запятую (по умолчанию все)
+        cluster [workers] [updates]    - Нагрузочный тест многопроцессного режима
+                                         (1, 2, 4, ... workers воркеров, по умолчанию 4;
+                                         updates вопросов, по умолчанию 2000)
+        compare <base> <new> [percent] - Сравнить два запуска, порог регрессии в процентах
+                                         (по умолчанию 10); код выхода 1 при регрессиях
+        help                           - Показать эту справку
+
+    Примеры:
+        python benchmark.py run
+        python benchmark.py run 1000000 after.json
+        python benchmark.py run 100000 handlers.json handlers,insert
+        python benchmark.py cluster 8 5000
+        python benchmark.py compare before.json after.json 5
+    """
+    print(help_text)
+
+
+def main():
+    """Главная функция"""
+    if len(sys.argv) < 2:
+        show_help()
+        return
+
+    command = sys.argv[1].lower()
+
+    if command == 'run':
+        rows = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+        output = sys.argv[3] if len(sys.argv) > 3 else 'benchmark_results.json'
+        only = set(sys.argv[4].split(',')) if len(sys.argv) > 4 else None
+        run_benchmarks(rows, output, only=only)
+
+    elif command == 'cluster':
+        max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+        updates = int(sys.argv[3]) if len(sys.argv) > 3 else 2000
+        output = sys.argv[4] if len(sys.argv) > 4 else 'benchmark_cluster.json'
+        run_cluster_benchmark(max_workers, updates, output)
+
+    elif command == 'cluster-worker':
+        # Служебная команда: воркер, запускаемый нагрузочным тестом
+        run_cluster_worker(int(sys.argv[2]), sys.argv[3])
+
+    elif command == 'compare':
+        if len(sys.argv) < 4:
+            print("❌ Укажите два файла с результатами")
+            return
+        threshold = float(sys.argv[4]) if len(sys.argv) > 4 else 10.0
+        if compare_results(sys.argv[2], sys.argv[3], threshold):
+            sys.exit(1)
+
+    elif command == 'help':
+        show_help()
+
+    else:
+        print(f"❌ Неизвестная команда: {command}")
+        print("Используйте 'python benchmark.py help' для справки")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,20 +2,41 @@
 Основной файл Telegram-бота для анонимных вопросов
 """
 import asyncio
+import datetime
+import html
+import sys
 
 from aiogram import Bot, Dispatcher, F
-from aiogram.filters import CommandStart
+from aiogram.filters import Command, CommandStart
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.types import (
-    Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+    Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, BufferedInputFile
 )
 from loguru import logger
+from peewee import fn
 
-from config import BOT_TOKEN, ADMIN_ID, CHANNEL_ID, MAX_QUESTION_LENGTH
-from models import Question, init_db, close_db
-from utils import generate_question_id, validate_question_text
+from config import (
+    BOT_TOKEN, ADMIN_IDS, MAX_QUESTION_LENGTH, PUBLISH_TARGETS, PUBLISH_CONCURRENCY,
+    UPDATE_WORKERS, UPDATE_QUEUE_SIZE, JOURNAL_FILE, BOT_WORKERS, CLUSTER_SOCKET_DIR,
+    USER_HASH_SECRET, NOTIFY_RATE, NOTIFY_TTL_DAYS
+)
+import analytics
+import answer_queue
+import cluster
+import moderators
+import profiler
+from executor import UpdateExecutor
+from journal import (
+    UpdateJournal, JournalArrivalMiddleware, JournalCompletionMiddleware, JournalFlushMiddleware
+)
+from models import Question, AnswerQueue, Publication, Notification, db, init_db, close_db
+from notifier import Notifier, get_preview
+from publisher import publish_to_targets
+from utils import (
+    encrypt_chat_id, format_duration, generate_question_id, hash_user_id, validate_question_text
+)
 
 # Настройка логирования
 logger.add("bot.log", encoding="utf-8", rotation="500 MB", level="INFO")
@@ -25,10 +46,36 @@ bot = Bot(token=BOT_TOKEN)
 storage = MemoryStorage()
 dp = Dispatcher(storage=storage)
 
+# Журнал обновлений: запись при получении, отметка после обработки,
+# сброс на диск перед подтверждением получения (getUpdates)
+journal = UpdateJournal(JOURNAL_FILE)
+bot.session.middleware(JournalFlushMiddleware(journal))
+
+# Обработка обновлений пулом воркеров с сохранением порядка для каждого пользователя
+executor = UpdateExecutor(workers=UPDATE_WORKERS, queue_size=UPDATE_QUEUE_SIZE)
+
+# Порядок важен: запись в журнал -> передача воркеру -> отметка о выполнении в воркере
+dp.update.outer_middleware(JournalArrivalMiddleware(journal))
+dp.update.outer_middleware(executor)
+dp.update.outer_middleware(JournalCompletionMiddleware(journal))
+
+# Уведомления авторов о публикации ответов (при заданном USER_HASH_SECRET)
+notifier = Notifier(bot, USER_HASH_SECRET, rate=NOTIFY_RATE, ttl_days=NOTIFY_TTL_DAYS)
+
+# Количество вопросов в ответе на /my
+MY_QUESTIONS_LIMIT = 10
+
+# Длительность профилирования CPU по команде /profile, с
+PROFILE_DEFAULT_SECONDS = 30
+PROFILE_MAX_SECONDS = 600
+
+# Фоновые задачи профилирования (ссылка нужна, чтобы задачу не удалил сборщик мусора)
+profile_tasks = set()
+
 
 # Состояния для FSM
 class AdminStates(StatesGroup):
-    waiting_for_video = State()  # Ожидание видеосообщения от администратора
+    waiting_for_video = State()  # Ожидание видеосообщения от администратора (есть очередь ответов)
 
 
 # ============== ОБРАБОТЧИКИ ДЛЯ ПОЛЬЗОВАТЕЛЕЙ ==============
@@ -51,12 +98,179 @@ async def cmd_start(message: Message):
         logger.error(f"Ошибка при отправке приветствия: {e}")
 
 
+@dp.message(Command("my"))
+async def cmd_my(message: Message):
+    """Обработчик команды /my - последние вопросы пользователя и их статус"""
+    if not USER_HASH_SECRET:
+        await message.answer("История вопросов недоступна: вопросы хранятся полностью анонимно.")
+        return
+
+    try:
+        # Диапазонное сканирование индекса (user_hash, created_at) с конца
+        questions = list(Question
+                         .select(Question.text, Question.status, Question.created_at, Question.published_at)
+                         .where(Question.user_hash == hash_user_id(message.from_user.id, USER_HASH_SECRET))
+                         .order_by(Question.created_at.desc())
+                         .limit(MY_QUESTIONS_LIMIT))
+
+        if not questions:
+            await message.answer("Вы ещё не задавали вопросов. Просто напишите свой вопрос в этот чат.")
+            return
+
+        lines = ["📋 <b>Ваши последние вопросы</b>\n"]
+        for question in questions:
+            if question.published_at:
+                status = "✅ ответ опубликован"
+            elif question.status == 'approved':
+                status = "🎬 принят, готовится ответ"
+            elif question.status == 'rejected':
+                status = "❌ отклонён"
+            else:
+                status = "⏳ на рассмотрении"
+            lines.append(
+                f"{question.created_at.strftime('%d.%m.%Y %H:%M')} — "
+                f"«{html.escape(get_preview(question.text))}»: {status}"
+            )
+        await message.answer("\n".join(lines), parse_mode="HTML")
+
+    except Exception as e:
+        logger.error(f"Ошибка при получении вопросов пользователя: {e}")
+        await message.answer("❌ Ошибка при получении вопросов. Попробуйте позже.")
+
+
+@dp.message(Command("queue"), F.from_user.id.in_(ADMIN_IDS))
+async def cmd_queue(message: Message):
+    """Обработчик команды /queue - очередь принятых вопросов администратора"""
+    await send_queue_list(message, message.from_user.id)
+
+
+@dp.message(Command("moderators"), F.from_user.id.in_(ADMIN_IDS))
+async def cmd_moderators(message: Message):
+    """Обработчик команды /moderators - нагрузка и время обработки модераторов"""
+    try:
+        lines = ["👥 <b>Модераторы</b>\n"]
+        for stats in moderators.get_stats():
+            lines.append(
+                f"<code>{stats['moderator_id']}</code>: "
+                f"ожидают {stats['pending']}, в очереди ответов {stats['queued']}, "
+                f"обработано {stats['handled']}, "
+                f"среднее время {format_duration(stats['avg_handling_seconds'])}"
+            )
+        await message.answer("\n".join(lines), parse_mode="HTML")
+    except Exception as e:
+        logger.error(f"Ошибка при получении статистики модераторов: {e}")
+        await message.answer("❌ Ошибка при получении статистики")
+
+
+@dp.message(Command("workers"), F.from_user.id.in_(ADMIN_IDS))
+async def cmd_workers(message: Message):
+    """Обработчик команды /workers - метрики очередей исполнителя обновлений"""
+    lines = ["⚙️ <b>Воркеры обработки обновлений</b>\n"]
+    for stats in executor.get_stats():
+        lines.append(
+            f"#{stats['shard']}: в очереди {stats['depth']} (макс. {stats['max_depth']}), "
+            f"обработано {stats['processed']}, ошибок {stats['errors']}, "
+            f"ожидание {stats['avg_wait_ms']:.0f} мс, обработка {stats['avg_handle_ms']:.0f} мс"
+        )
+
+    journal_stats = journal.get_stats()
+    lines.append(
+        f"\n📒 <b>Журнал</b>: незавершённых {journal_stats['pending']}, "
+        f"записано {journal_stats['appended']}, "
+        f"в среднем {journal_stats['avg_batch']:.1f} записей за {journal_stats['avg_flush_ms']:.1f} мс, "
+        f"повторно обработано {journal_stats['replayed']}"
+    )
+
+    notifier_stats = notifier.get_stats()
+    lines.append(
+        f"🔔 <b>Уведомления</b>: в очереди {notifier_stats['queued']}, "
+        f"отправлено {notifier_stats['sent']}, ошибок {notifier_stats['failed']}, "
+        f"удалено просроченных {notifier_stats['purged']}"
+    )
+    await message.answer("\n".join(lines), parse_mode="HTML")
+
+
+@dp.message(Command("profile"), F.from_user.id.in_(ADMIN_IDS))
+async def cmd_profile(message: Message):
+    """Обработчик команды /profile [секунды] - профиль CPU работающего бота"""
+    args = message.text.split()[1:]
+    if args and (not args[0].isdigit() or int(args[0]) < 1):
+        await message.answer(f"Использование: /profile [секунды от 1 до {PROFILE_MAX_SECONDS}], "
+                             f"по умолчанию {PROFILE_DEFAULT_SECONDS}")
+        return
+
+    seconds = min(int(args[0]) if args else PROFILE_DEFAULT_SECONDS, PROFILE_MAX_SECONDS)
+    if profiler.is_cpu_profiling():
+        await message.answer("⏳ Профилирование уже запущено")
+        return
+
+    # Профилирование идёт в фоне, чтобы не задерживать другие обновления администратора
+    task = asyncio.create_task(send_cpu_profile(message.chat.id, seconds))
+    profile_tasks.add(task)
+    task.add_done_callback(profile_tasks.discard)
+
+    await message.answer(f"⏱ Профилирование CPU запущено на {seconds} с")
+    logger.info(f"Модератор {message.from_user.id} запустил профилирование CPU на {seconds} с")
+
+
+async def send_cpu_profile(chat_id: int, seconds: int):
+    """Профилирование CPU и отправка отчёта файлом"""
+    try:
+        report = await profiler.profile_cpu(seconds)
+        filename = f"profile_{datetime.datetime.now():%Y%m%d_%H%M%S}.txt"
+        await bot.send_document(
+            chat_id=chat_id,
+            document=BufferedInputFile(report.encode(), filename=filename),
+            caption=f"📈 Профиль CPU за {seconds} с"
+        )
+    except Exception as e:
+        logger.error(f"Ошибка при профилировании CPU: {e}")
+        await bot.send_message(chat_id=chat_id, text=f"❌ Ошибка при профилировании: {e}")
+
+
+@dp.message(Command("memory"), F.from_user.id.in_(ADMIN_IDS))
+async def cmd_memory(message: Message):
+    """Обработчик команды /memory start|snapshot|stop - снимки памяти tracemalloc"""
+    args = message.text.split()[1:]
+    action = args[0] if args else 'snapshot'
+
+    try:
+        if action == 'start':
+            profiler.start_memory_tracing()
+            await message.answer(
+                "🧠 Отслеживание памяти запущено, базовый снимок сделан.\n"
+                "/memory snapshot — сравнить с базовым, /memory stop — остановить"
+            )
+        elif action == 'snapshot':
+            # Снимок и сравнение занимают секунды — в отдельном потоке, чтобы не блокировать обработку
+            report = await asyncio.to_thread(profiler.take_memory_report)
+            filename = f"memory_{datetime.datetime.now():%Y%m%d_%H%M%S}.txt"
+            await message.answer_document(
+                BufferedInputFile(report.encode(), filename=filename),
+                caption="🧠 Снимок памяти (сравнение с базовым)"
+            )
+        elif action == 'stop':
+            profiler.stop_memory_tracing()
+            await message.answer("🧠 Отслеживание памяти остановлено")
+        else:
+            await message.answer("Использование: /memory start|snapshot|stop")
+            return
+
+        logger.info(f"Модератор {message.from_user.id} выполнил /memory {action}")
+
+    except RuntimeError as e:
+        await message.answer(f"❌ {e}")
+    except Exception as e:
+        logger.error(f"Ошибка при снимке памяти: {e}")
+        await message.answer("❌ Ошибка при снимке памяти")
+
+
 @dp.message(F.text & ~F.photo & ~F.document & ~F.video & ~F.audio)
 async def handle_question(message: Message):
     """Обработчик текстовых сообщений (вопросов) от пользователей"""
 
-    # Игнорируем сообщения от администратора (если он не в режиме ожидания видео)
-    if message.from_user.id == ADMIN_ID:
+    # Игнорируем сообщения от модераторов (если они не в режиме ожидания видео)
+    if message.from_user.id in ADMIN_IDS:
         return
 
     question_text = message.text
@@ -70,13 +284,21 @@ async def handle_question(message: Message):
         return
 
     try:
-        # Генерация ID и сохранение вопроса в БД
+        # Генерация ID, назначение модератора и сохранение вопроса в БД
         question_id = generate_question_id()
-        Question.create(
-            id=question_id,
-            text=question_text,
-            status='pending'
-        )
+        moderator_id = moderators.choose_moderator()
+        with db.atomic():
+            question = Question.create(
+                id=question_id,
+                text=question_text,
+                status='pending',
+                moderator_id=moderator_id,
+                user_hash=hash_user_id(message.from_user.id, USER_HASH_SECRET) if USER_HASH_SECRET else None
+            )
+            if USER_HASH_SECRET:
+                Notification.create(question=question_id,
+                                    chat_id=encrypt_chat_id(message.chat.id, USER_HASH_SECRET))
+        analytics.record_event('created', question.created_at)
 
         # Подтверждение пользователю
         confirmation_text = (
@@ -87,6 +309,8 @@ async def handle_question(message: Message):
             "Ответ может занять какое-то время.\n\n"
             "А пока подписывайтесь @marilav_clinic чтобы ничего не пропустить!"
         )
+        if USER_HASH_SECRET:
+            confirmation_text += "\n\nКогда ответ будет опубликован, я пришлю уведомление. Статус вопросов — /my"
 
         await message.answer(
             confirmation_text,
@@ -94,8 +318,8 @@ async def handle_question(message: Message):
             disable_web_page_preview=True
         )
 
-        # Уведомление администратору
-        await send_question_to_admin(question_id, question_text)
+        # Уведомление назначенному модератору
+        await send_question_to_admin(question_id, question_text, moderator_id)
 
         logger.info(f"Новый вопрос {question_id} от пользователя {message.from_user.id}")
 
@@ -107,7 +331,7 @@ async def handle_question(message: Message):
 @dp.message(F.content_type.in_({'photo', 'document', 'video', 'audio', 'voice', 'sticker'}))
 async def handle_attachments(message: Message):
     """Обработчик вложений - запрещаем их"""
-    if message.from_user.id != ADMIN_ID:
+    if message.from_user.id not in ADMIN_IDS:
         await message.answer(
             "❌ Пожалуйста, отправьте только текстовый вопрос без вложений."
         )
@@ -124,8 +348,13 @@ async def handle_attachments(message: Message):
 '''
 
 
-async def send_question_to_admin(question_id: str, question_text: str):
-    """Отправка вопроса администратору с кнопками модерации"""
+async def send_question_to_admin(question_id: str, question_text: str, moderator_id: int) -> int | None:
+    """
+    Отправка вопроса назначенному модератору с кнопками модерации
+    Если модератору отправить не удалось (не запускал бота, заблокировал его), вопрос
+    передаётся следующему по нагрузке модератору пула и переназначается ему
+    Возвращает ID модератора, получившего вопрос, или None, если не получил никто
+    """
 
     # Создание inline-кнопок
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -143,114 +372,368 @@ async def send_question_to_admin(question_id: str, question_text: str):
         f"<b>Вопрос:</b>\n{question_text}"
     )
 
-    try:
-        await bot.send_message(
-            chat_id=ADMIN_ID,
-            text=admin_message,
-            reply_markup=keyboard,
-            parse_mode="HTML"
-        )
-        logger.info(f"Вопрос {question_id} отправлен администратору")
-    except Exception as e:
-        logger.error(f"Ошибка при отправке вопроса администратору: {e}")
-
-
-@dp.callback_query(F.data.startswith("approve_"))
+    async def deliver(chat_id: int) -> bool:
+        try:
+            await bot.send_message(
+                chat_id=chat_id,
+                text=admin_message,
+                reply_markup=keyboard,
+                parse_mode="HTML"
+            )
+            logger.info(f"Вопрос {question_id} отправлен модератору {chat_id}")
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка при отправке вопроса модератору {chat_id}: {e}")
+            return False
+
+    if await deliver(moderator_id):
+        return moderator_id
+
+    # Остальные модераторы опрашиваются только после ошибки
+    for candidate_id in moderators.get_fallback_order(exclude={moderator_id}):
+        if await deliver(candidate_id):
+            # Переназначение, только если вопрос ещё не обработан
+            (Question
+             .update(moderator_id=candidate_id)
+             .where((Question.id == question_id) & (Question.status == 'pending'))
+             .execute())
+            logger.warning(f"Вопрос {question_id} переназначен модератору {candidate_id}")
+            return candidate_id
+
+    logger.error(f"Вопрос {question_id} не удалось отправить ни одному модератору")
+    return None
+
+
+async def set_moderation_status(callback: CallbackQuery, question_id: str, status: str) -> int | None:
+    """
+    Перевод вопроса из статуса pending в status (compare-and-set)
+    Возвращает None, если вопрос уже обработан (повторное нажатие или другой модератор);
+    для принятого вопроса — место в очереди ответов, для отклонённого — 0
+    """
+    position = apply_moderation(question_id, callback.from_user.id, status)
+
+    if position is None:
+        await callback.message.edit_reply_markup(reply_markup=None)
+        await callback.answer("Вопрос уже обработан", show_alert=True)
+        logger.info(f"Повторная модерация вопроса {question_id} пропущена")
+
+    return position
+
+
+def apply_moderation(question_id: str, moderator_id: int, status: str) -> int | None:
+    """
+    Смена статуса, учёт в аналитике и постановка принятого вопроса в очередь ответов
+    одной транзакцией: принятый вопрос не может остаться вне очереди
+    Принятый, но не опубликованный вопрос, которого нет ни в одной очереди
+    (например, после сбоя прошлых версий), при повторном принятии ставится в очередь
+    """
+    moderated_at = datetime.datetime.now()
+
+    with db.atomic('IMMEDIATE'):
+        updated = (Question
+                   .update(status=status,
+                           moderator_id=moderator_id,
+                           moderated_at=moderated_at)
+                   .where((Question.id == question_id) & (Question.status == 'pending'))
+                   .execute())
+
+        if updated:
+            # Учёт времени модерации в почасовых агрегатах
+            created_at = Question.get_by_id(question_id).created_at
+            analytics.record_transition(status, created_at, moderated_at)
+        elif status != 'approved' or not is_lost_approval(question_id):
+            return None
+
+        if status == 'approved':
+            return answer_queue.enqueue(moderator_id, question_id)
+        return 0
+
+
+def is_lost_approval(question_id: str) -> bool:
+    """Вопрос принят, не опубликован и не стоит ни в одной очереди ответов"""
+    return (Question
+            .select()
+            .where((Question.id == question_id) &
+                   (Question.status == 'approved') &
+                   (Question.published_at.is_null()) &
+                   ~fn.EXISTS(AnswerQueue.select().where(AnswerQueue.question == question_id)))
+            .exists())
+
+
+@dp.callback_query(F.data.startswith("approve_"), F.from_user.id.in_(ADMIN_IDS))
 async def callback_approve(callback: CallbackQuery, state: FSMContext):
     """Обработчик нажатия кнопки 'Принять'"""
 
     question_id = callback.data.split("_", 1)[1]
 
     try:
-        # Обновление статуса в БД
-        Question.update(status='approved').where(Question.id == question_id).execute()
+        # Обновление статуса и постановка в очередь ответов (только если вопрос ещё не обработан)
+        position = await set_moderation_status(callback, question_id, 'approved')
+        if position is None:
+            return
 
-        # Сохранение ID вопроса в состоянии
-        await state.update_data(question_id=question_id)
         await state.set_state(AdminStates.waiting_for_video)
 
         # Уведомление администратору
         await callback.message.edit_reply_markup(reply_markup=None)
         await callback.message.answer(
             "✅ <b>Вопрос принят!</b>\n\n"
-            "Теперь отправьте видеосообщение (кружочек) с ответом.",
+            f"Место в очереди ответов: {position}.\n"
+            "Видеосообщения (кружочки) публикуются как ответы по порядку очереди.",
             parse_mode="HTML"
         )
+        if position == 1:
+            await send_queue_head(callback.message, callback.from_user.id)
 
         await callback.answer("Вопрос принят")
-        logger.info(f"Администратор принял вопрос {question_id}")
+        logger.info(f"Модератор {callback.from_user.id} принял вопрос {question_id} "
+                    f"(место в очереди: {position})")
 
     except Exception as e:
         logger.error(f"Ошибка при принятии вопроса: {e}")
         await callback.answer("Ошибка при обработке", show_alert=True)
 
 
-@dp.callback_query(F.data.startswith("reject_"))
+@dp.callback_query(F.data.startswith("reject_"), F.from_user.id.in_(ADMIN_IDS))
 async def callback_reject(callback: CallbackQuery):
     """Обработчик нажатия кнопки 'Отклонить'"""
 
     question_id = callback.data.split("_", 1)[1]
 
     try:
-        # Обновление статуса в БД
-        Question.update(status='rejected').where(Question.id == question_id).execute()
+        # Обновление статуса в БД (только если вопрос ещё не обработан)
+        if await set_moderation_status(callback, question_id, 'rejected') is None:
+            return
+
+        # Уведомление автору не понадобится — ID чата удаляется сразу
+        Notification.delete().where(Notification.question == question_id).execute()
 
         # Уведомление администратору
         await callback.message.edit_reply_markup(reply_markup=None)
         await callback.message.answer("❌ Вопрос отклонён")
 
         await callback.answer("Вопрос отклонён")
-        logger.info(f"Администратор отклонил вопрос {question_id}")
+        logger.info(f"Модератор {callback.from_user.id} отклонил вопрос {question_id}")
 
     except Exception as e:
         logger.error(f"Ошибка при отклонении вопроса: {e}")
         await callback.answer("Ошибка при обработке", show_alert=True)
 
 
-@dp.message(AdminStates.waiting_for_video, F.video_note)
-async def handle_admin_video(message: Message, state: FSMContext):
-    """Обработчик видеосообщения (кружочка) от администратора"""
+@dp.callback_query(F.data == "queue_skip", F.from_user.id.in_(ADMIN_IDS))
+async def callback_queue_skip(callback: CallbackQuery):
+    """Обработчик кнопки 'Пропустить' - перенос первого вопроса в конец очереди"""
+    try:
+        if answer_queue.skip_head(callback.from_user.id):
+            await callback.message.edit_reply_markup(reply_markup=None)
+            await send_queue_head(callback.message, callback.from_user.id)
+            await callback.answer("Вопрос перенесён в конец очереди")
+        else:
+            await callback.answer("В очереди нет других вопросов")
+    except Exception as e:
+        logger.error(f"Ошибка при пропуске вопроса в очереди: {e}")
+        await callback.answer("Ошибка при обработке", show_alert=True)
+
+
+@dp.callback_query(F.data == "queue_list", F.from_user.id.in_(ADMIN_IDS))
+async def callback_queue_list(callback: CallbackQuery):
+    """Обработчик кнопки 'Очередь' - список принятых вопросов"""
+    await send_queue_list(callback.message, callback.from_user.id)
+    await callback.answer()
+
+
+@dp.callback_query(F.data.startswith("queue_top_"), F.from_user.id.in_(ADMIN_IDS))
+async def callback_queue_top(callback: CallbackQuery):
+    """Обработчик кнопки перемещения вопроса в начало очереди"""
+
+    question_id = callback.data.split("_", 2)[2]
+
+    try:
+        if not answer_queue.move_to_front(callback.from_user.id, question_id):
+            await callback.answer("Вопрос уже не в очереди", show_alert=True)
+            return
+
+        await callback.message.edit_reply_markup(reply_markup=None)
+        await send_queue_head(callback.message, callback.from_user.id)
+        await callback.answer("Вопрос перемещён в начало очереди")
+        logger.info(f"Администратор переместил вопрос {question_id} в начало очереди")
+    except Exception as e:
+        logger.error(f"Ошибка при изменении порядка очереди: {e}")
+        await callback.answer("Ошибка при обработке", show_alert=True)
 
-    # Получение ID вопроса из состояния
-    data = await state.get_data()
-    question_id = data.get('question_id')
 
-    if not question_id:
-        await message.answer("❌ Ошибка: не найден ID вопроса")
-        await state.clear()
+async def send_queue_head(message: Message, admin_id: int):
+    """Показ вопроса, на который будет опубликовано следующее видеосообщение"""
+
+    head = answer_queue.get_head(admin_id)
+    if head is None:
+        await message.answer("📭 Очередь ответов пуста")
+        return
+
+    size = answer_queue.get_size(admin_id)
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [
+            InlineKeyboardButton(text="⏭ Пропустить", callback_data="queue_skip"),
+            InlineKeyboardButton(text="📋 Очередь", callback_data="queue_list")
+        ]
+    ])
+
+    await message.answer(
+        f"🎥 <b>Следующий ответ</b> (в очереди: {size})\n\n"
+        f"<b>ID:</b> <code>{head.question.id}</code>\n\n"
+        f"<b>Вопрос:</b>\n{html.escape(head.question.text)}\n\n"
+        "Отправьте видеосообщение (кружочек) с ответом.",
+        reply_markup=keyboard,
+        parse_mode="HTML"
+    )
+
+
+async def send_queue_list(message: Message, admin_id: int, limit: int = 10):
+    """Показ очереди ответов с кнопками перемещения вопросов в начало"""
+
+    entries = answer_queue.get_entries(admin_id, limit)
+    if not entries:
+        await message.answer("📭 Очередь ответов пуста")
         return
 
+    lines = []
+    buttons = []
+    for number, entry in enumerate(entries, start=1):
+        text = entry.question.text
+        preview = text[:80] + ('...' if len(text) > 80 else '')
+        lines.append(f"{number}. {html.escape(preview)}")
+        if number > 1:
+            buttons.append(InlineKeyboardButton(
+                text=f"⬆️ {number}", callback_data=f"queue_top_{entry.question.id}"
+            ))
+
+    size = answer_queue.get_size(admin_id)
+    header = f"📋 <b>Очередь ответов</b> (всего: {size})\n\n"
+    # По 5 кнопок в ряд
+    keyboard = InlineKeyboardMarkup(
+        inline_keyboard=[buttons[i:i + 5] for i in range(0, len(buttons), 5)]
+    ) if buttons else None
+
+    await message.answer(header + "\n".join(lines), reply_markup=keyboard, parse_mode="HTML")
+
+
+@dp.message(F.video_note, F.from_user.id.in_(ADMIN_IDS))
+async def handle_admin_video(message: Message, state: FSMContext):
+    """Обработчик видеосообщения (кружочка) от администратора"""
+
+    admin_id = message.from_user.id
+    video_unique_id = message.video_note.file_unique_id
+
     try:
-        # Получение информации о вопросе из БД
-        question = Question.get_or_none(Question.id == question_id)
+        # Кружочек, уже опубликованный как ответ (например, повторная обработка обновления
+        # после перезапуска), не должен стать ответом на следующий вопрос очереди
+        if (Question
+                .select()
+                .where((Question.video_unique_id == video_unique_id) & (Question.published_at.is_null(False)))
+                .exists()):
+            await message.answer("ℹ️ Этот кружочек уже опубликован как ответ")
+            logger.info(f"Повторная публикация кружочка {video_unique_id} пропущена")
+            return
 
-        if not question:
-            await message.answer("❌ Вопрос не найден в базе данных")
+        # Ответ публикуется на первый вопрос из очереди администратора
+        entry = answer_queue.get_head(admin_id)
+
+        if not entry:
+            await message.answer("❌ Очередь ответов пуста — сначала примите вопрос")
             await state.clear()
             return
 
+        question = entry.question
+        question_id = question.id
+
         # Сохранение file_id видео в БД
         video_file_id = message.video_note.file_id
-        Question.update(video_file_id=video_file_id).where(Question.id == question_id).execute()
+        (Question
+         .update(video_file_id=video_file_id, video_unique_id=video_unique_id)
+         .where(Question.id == question_id)
+         .execute())
 
-        # Публикация в канале
-        await publish_to_channel(question.text, video_file_id)
+        # Публикация во все каналы
+        results = await publish_to_channel(question_id, question.text, video_file_id)
+
+        # Отметка о публикации и удаление вопроса из очереди только после успешной публикации
+        published_at = datetime.datetime.now()
+        Question.update(published_at=published_at).where(Question.id == question_id).execute()
+        analytics.record_transition('published', question.created_at, published_at)
+        answer_queue.remove(question_id)
+        notifier.enqueue(question_id)
 
         # Уведомление администратору
-        await message.answer(
-            "✅ <b>Вопрос опубликован в канале!</b>",
-            parse_mode="HTML"
-        )
+        failed = [result for result in results if not result.success]
+        if failed:
+            await send_publish_failures(message, question_id, failed)
+        else:
+            await message.answer(
+                "✅ <b>Вопрос опубликован в канале!</b>",
+                parse_mode="HTML"
+            )
+
+        logger.info(f"Вопрос {question_id} опубликован в {len(results) - len(failed)} из {len(results)} каналов")
+
+        # Показ следующего вопроса или очистка состояния
+        if answer_queue.get_size(admin_id):
+            await state.set_state(AdminStates.waiting_for_video)
+            await send_queue_head(message, admin_id)
+        else:
+            await message.answer("📭 Очередь ответов пуста")
+            await state.clear()
+
+    except Exception as e:
+        logger.error(f"Ошибка при публикации вопроса: {e}")
+        await message.answer("❌ Произошла ошибка при публикации. Вопрос остался в очереди.")
+
+
+async def send_publish_failures(message: Message, question_id: str, failed: list):
+    """Сообщение о каналах, куда публикация не удалась, с кнопкой повторной публикации"""
+    failed_list = "\n".join(
+        f"• <code>{html.escape(result.target)}</code>: {html.escape(result.error)}" for result in failed
+    )
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🔁 Повторить", callback_data=f"publish_retry_{question_id}")]
+    ])
+    await message.answer(
+        "⚠️ <b>Вопрос опубликован не во все каналы.</b>\n\n"
+        f"Ошибки:\n{failed_list}\n\n"
+        "Вопрос убран из очереди, следующий кружочек станет ответом на следующий вопрос. "
+        "Кнопка «Повторить» отправит этот ответ в каналы с ошибками.",
+        reply_markup=keyboard,
+        parse_mode="HTML"
+    )
 
-        # Очистка состояния
-        await state.clear()
 
-        logger.info(f"Вопрос {question_id} опубликован в канале")
+@dp.callback_query(F.data.startswith("publish_retry_"), F.from_user.id.in_(ADMIN_IDS))
+async def callback_publish_retry(callback: CallbackQuery):
+    """Обработчик кнопки 'Повторить' - публикация ответа в каналы, где она не удалась"""
+
+    question_id = callback.data.split("_", 2)[2]
+
+    try:
+        question = Question.get_or_none(Question.id == question_id)
+        if question is None or not question.video_file_id:
+            await callback.answer("Ответ на вопрос не найден", show_alert=True)
+            return
+
+        results = await publish_to_channel(question_id, question.text, question.video_file_id)
+        await callback.message.edit_reply_markup(reply_markup=None)
+
+        failed = [result for result in results if not result.success]
+        if failed:
+            await send_publish_failures(callback.message, question_id, failed)
+        else:
+            await callback.message.answer("✅ <b>Ответ опубликован во все каналы!</b>", parse_mode="HTML")
+
+        await callback.answer()
+        logger.info(f"Повторная публикация вопроса {question_id}: "
+                    f"успешно в {len(results) - len(failed)} из {len(results)} каналов")
 
     except Exception as e:
-        logger.error(f"Ошибка при публикации вопроса: {e}")
-        await message.answer("❌ Произошла ошибка при публикации")
-        await state.clear()
+        logger.error(f"Ошибка при повторной публикации вопроса {question_id}: {e}")
+        await callback.answer("Не удалось опубликовать, попробуйте позже", show_alert=True)
 
 
 @dp.message(AdminStates.waiting_for_video)
@@ -261,8 +744,15 @@ async def handle_wrong_content(message: Message):
     )
 
 
-async def publish_to_channel(question_text: str, video_file_id: str):
-    """Публикация вопроса и ответа в канале"""
+async def publish_to_channel(question_id: str, question_text: str, video_file_id: str) -> list:
+    """
+    Публикация вопроса и ответа во все каналы из PUBLISH_TARGETS
+    Каналы, где вопрос уже успешно опубликован, пропускаются: если не удалось ни в один
+    канал, вопрос остаётся в очереди и следующий кружочек уйдёт во все каналы; если удалось
+    частично, вопрос убирается из очереди, а кнопка «Повторить» отправляет сохранённый
+    ответ только в каналы с ошибками
+    Возвращает результаты по каналам; если не удалось ни в один канал — исключение
+    """
 
     # Формирование текста поста
     caption = (
@@ -270,25 +760,34 @@ async def publish_to_channel(question_text: str, video_file_id: str):
         f"{question_text}"
     )
 
-    try:
-        # Отправка видеосообщения с подписью в канал
-        await bot.send_video_note(
-            chat_id=CHANNEL_ID,
-            video_note=video_file_id,
-            duration=None  # Автоматическая длительность
-        )
+    published = {
+        target for (target,) in Publication
+        .select(Publication.target)
+        .where((Publication.question == question_id) & (Publication.success == True))
+        .tuples()
+    }
+    targets = [target for target in PUBLISH_TARGETS if target not in published]
 
-        # Отправка текста отдельным сообщением (т.к. кружочки не поддерживают длинные подписи)
-        await bot.send_message(
-            chat_id=CHANNEL_ID,
-            text=caption
-        )
+    results = await publish_to_targets(bot, targets, caption, video_file_id, PUBLISH_CONCURRENCY)
 
-        logger.info(f"Пост опубликован в канале {CHANNEL_ID}")
+    # Сохранение результата по каждому каналу
+    for result in results:
+        Publication.insert(
+            question=question_id,
+            target=result.target,
+            success=result.success,
+            message_id=result.message_id,
+            error=result.error,
+            published_at=datetime.datetime.now()
+        ).on_conflict(
+            conflict_target=[Publication.question, Publication.target],
+            preserve=[Publication.success, Publication.message_id, Publication.error, Publication.published_at]
+        ).execute()
 
-    except Exception as e:
-        logger.error(f"Ошибка при публикации в канале: {e}")
-        raise
+    if results and not any(result.success for result in results):
+        raise RuntimeError(f"Не удалось опубликовать вопрос {question_id} ни в один канал")
+
+    return results
 
 
 # ============== ЗАПУСК БОТА ==============
@@ -299,20 +798,87 @@ async def main():
     # Инициализация базы данных
     init_db()
 
+    # Запуск воркеров обработки обновлений и отправки уведомлений
+    await executor.start()
+    await notifier.start()
+
+    # Повторная обработка обновлений, не завершённых до перезапуска
+    await journal.start()
+    replayed = await journal.replay(dp, bot)
+    if replayed:
+        await executor.join()
+        stats = journal.get_stats()
+        logger.info(f"Повторно обработано обновлений: {replayed} ({stats['replay_rate']:.0f} в секунду)")
+
     logger.info("Бот запущен")
 
     try:
-        # Запуск polling
-        await dp.start_polling(bot)
+        # Запуск polling: обновления передаются воркерам последовательно,
+        # поэтому заполненная очередь воркера приостанавливает получение новых
+        await dp.start_polling(bot, handle_as_tasks=False)
     finally:
-        # Закрытие соединений при остановке
+        # Обработка уже полученных обновлений и закрытие соединений при остановке
+        await executor.stop()
+        await notifier.stop()
+        await journal.close()
         await bot.session.close()
         close_db()
         logger.info("Бот остановлен")
 
 
+async def main_worker(index: int):
+    """Запуск процесса-воркера в многопроцессном режиме"""
+
+    # Инициализация базы данных
+    init_db()
+
+    # У каждого воркера свой журнал обновлений
+    journal.path = f"{JOURNAL_FILE}.{index}"
+
+    await executor.start()
+    await journal.start()
+
+    # Неотправленные до перезапуска уведомления досылает только первый воркер
+    await notifier.start(resume=index == 0)
+
+    try:
+        await cluster.run_worker(index, bot, dp, journal, CLUSTER_SOCKET_DIR)
+    finally:
+        await executor.stop()
+        await notifier.stop()
+        await journal.close()
+        await bot.session.close()
+        close_db()
+        logger.info(f"Воркер {index} остановлен")
+
+
+async def main_front(workers: int):
+    """Запуск фронтального процесса в многопроцессном режиме"""
+
+    # Миграции выполняются один раз до запуска воркеров
+    init_db()
+    close_db()
+
+    try:
+        await cluster.run_front(bot, dp.resolve_used_update_types(), workers, CLUSTER_SOCKET_DIR, __file__)
+    finally:
+        await bot.session.close()
+
+
 if __name__ == '__main__':
+    # python bot.py                 — один процесс (BOT_WORKERS=1)
+    # python bot.py --workers N     — фронтальный процесс и N воркеров
+    # python bot.py --worker I      — воркер I (запускается фронтальным процессом)
+    workers = BOT_WORKERS
+    if len(sys.argv) > 2 and sys.argv[1] == '--workers':
+        workers = int(sys.argv[2])
+
     try:
-        asyncio.run(main())
+        if len(sys.argv) > 2 and sys.argv[1] == '--worker':
+            asyncio.run(main_worker(int(sys.argv[2])))
+        elif workers > 1:
+            asyncio.run(main_front(workers))
+        else:
+            asyncio.run(main())
     except KeyboardInterrupt:
         logger.info("Бот остановлен пользователем")
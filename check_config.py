@@ -54,16 +54,20 @@ def check_env_variables():
     else:
         print_success(f"BOT_TOKEN установлен (длина: {len(bot_token)} символов)")
 
-    # Проверка ADMIN_ID
+    # Проверка ADMIN_ID / ADMIN_IDS
     admin_id = os.getenv('ADMIN_ID')
-    if not admin_id:
-        errors.append("ADMIN_ID не установлен")
-    elif not admin_id.isdigit():
+    admin_ids = [value.strip() for value in os.getenv('ADMIN_IDS', '').split(',') if value.strip()]
+    if not admin_id and not admin_ids:
+        errors.append("ADMIN_ID или ADMIN_IDS не установлен")
+    elif admin_id and not admin_id.isdigit():
         errors.append("ADMIN_ID должен быть числом")
+    elif not all(value.isdigit() for value in admin_ids):
+        errors.append("ADMIN_IDS должен содержать числа через запятую")
     elif admin_id == '123456789':
         errors.append("ADMIN_ID не изменен (используется значение по умолчанию)")
     else:
-        print_success(f"ADMIN_ID установлен: {admin_id}")
+        moderator_ids = list(dict.fromkeys(([admin_id] if admin_id else []) + admin_ids))
+        print_success(f"Модераторы: {', '.join(moderator_ids)}")
 
     # Проверка CHANNEL_ID
     channel_id = os.getenv('CHANNEL_ID')
@@ -76,6 +80,13 @@ def check_env_variables():
     else:
         print_success(f"CHANNEL_ID установлен: {channel_id}")
 
+    # Проверка USER_HASH_SECRET (необязательный)
+    user_hash_secret = os.getenv('USER_HASH_SECRET')
+    if user_hash_secret and len(user_hash_secret) < 32:
+        warnings.append("USER_HASH_SECRET короче 32 символов — используйте случайную строку")
+    elif user_hash_secret:
+        print_success("USER_HASH_SECRET установлен: команда /my и уведомления о публикации включены")
+
     return errors, warnings
 
 
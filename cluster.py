@@ -0,0 +1,267 @@
+"""
+Многопроцессный режим бота
+
+Фронтальный процесс получает обновления от Telegram и распределяет их по N
+процессам-воркерам по ID пользователя через Unix-сокеты. Обновления одного
+пользователя (в том числе администратора с его состоянием FSM) всегда попадают
+в один и тот же воркер. Воркеры работают с общей базой SQLite в режиме WAL.
+
+Протокол — JSON по строке на сообщение:
+    фронт -> воркер: {"id": <update_id>, "update": {...}}
+    воркер -> фронт: {"id": <update_id>} — обновление записано в журнал воркера
+
+Фронт не запрашивает следующую порцию обновлений (и тем самым не подтверждает
+Telegram получение текущей), пока все отправленные обновления не записаны
+в журналы воркеров. Фронт также перезапускает упавшие воркеры.
+"""
+import asyncio
+import json
+import os
+import signal
+import sys
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.methods import GetUpdates
+from aiogram.types import TelegramObject, Update
+from loguru import logger
+
+from journal import UpdateJournal
+
+# Пауза перед перезапуском упавшего воркера, с
+RESTART_DELAY = 5
+
+# Максимальное количество обновлений, ожидающих подтверждения от одного воркера
+MAX_IN_FLIGHT = 1000
+
+
+def get_socket_path(socket_dir: str, index: int) -> str:
+    """Путь к Unix-сокету воркера"""
+    return os.path.join(socket_dir, f"worker-{index}.sock")
+
+
+def get_worker_index(update: Update, data: dict[str, Any], workers: int) -> int:
+    """Номер воркера для обновления (по ID пользователя, иначе по ID чата)"""
+    user = data.get("event_from_user")
+    chat = data.get("event_chat")
+    if user:
+        key = user.id
+    elif chat:
+        key = chat.id
+    else:
+        key = update.update_id
+    return key % workers
+
+
+# ============== ФРОНТАЛЬНЫЙ ПРОЦЕСС ==============
+
+class WorkerConnection:
+    """Соединение фронта с одним воркером"""
+
+    def __init__(self, index: int, socket_path: str):
+        self.index = index
+        self.socket_path = socket_path
+        self.unconfirmed: dict[int, tuple[bytes, asyncio.Future]] = {}  # Ещё не записанные воркером
+        self._writer: asyncio.StreamWriter | None = None
+        self._connected = asyncio.Event()
+        self._slots = asyncio.Semaphore(MAX_IN_FLIGHT)
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run(), name=f"worker-connection-{self.index}")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if self._writer:
+            self._writer.close()
+
+    async def wait_connected(self):
+        """Ожидание подключения к воркеру"""
+        await self._connected.wait()
+
+    async def send(self, update: Update) -> asyncio.Future:
+        """Отправка обновления воркеру; future завершится после записи в журнал воркера"""
+        await self._slots.acquire()
+
+        raw = update.model_dump(mode='json', exclude_none=True, by_alias=True)
+        line = (json.dumps({'id': update.update_id, 'update': raw}, ensure_ascii=False) + '\n').encode()
+        future = asyncio.get_running_loop().create_future()
+        self.unconfirmed[update.update_id] = (line, future)
+
+        await self._connected.wait()
+        try:
+            self._writer.write(line)
+            await self._writer.drain()
+        except (ConnectionError, OSError) as e:
+            # Обновление останется в unconfirmed и будет отправлено после переподключения
+            logger.warning(f"Воркер {self.index} недоступен: {e}")
+        return future
+
+    async def _run(self):
+        """Подключение к воркеру, чтение подтверждений и переподключение при обрыве"""
+        while True:
+            try:
+                reader, self._writer = await asyncio.open_unix_connection(self.socket_path)
+            except (ConnectionError, OSError):
+                await asyncio.sleep(0.5)
+                continue
+
+            logger.info(f"Подключение к воркеру {self.index} установлено")
+
+            # Повторная отправка обновлений, не подтверждённых до обрыва соединения
+            for update_id in sorted(self.unconfirmed):
+                self._writer.write(self.unconfirmed[update_id][0])
+            self._connected.set()
+
+            try:
+                while line := await reader.readline():
+                    update_id = json.loads(line)['id']
+                    entry = self.unconfirmed.pop(update_id, None)
+                    if entry:
+                        entry[1].set_result(True)
+                        self._slots.release()
+            except (ConnectionError, OSError):
+                pass
+
+            self._connected.clear()
+            self._writer.close()
+            logger.warning(f"Соединение с воркером {self.index} потеряно, переподключение")
+            await asyncio.sleep(0.5)
+
+
+class FrontRouterMiddleware(BaseMiddleware):
+    """Передача обновления воркеру вместо обработки во фронтальном процессе"""
+
+    def __init__(self, connections: list[WorkerConnection]):
+        self.connections = connections
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: dict[str, Any]
+    ) -> Any:
+        index = get_worker_index(event, data, len(self.connections))
+        await self.connections[index].send(event)
+
+
+class ConfirmBeforePollingMiddleware(BaseRequestMiddleware):
+    """Ожидание записи всех отправленных обновлений в журналы воркеров перед getUpdates"""
+
+    def __init__(self, connections: list[WorkerConnection]):
+        self.connections = connections
+
+    async def __call__(self, make_request, bot: Bot, method):
+        if isinstance(method, GetUpdates):
+            futures = [future for connection in self.connections
+                       for _, future in list(connection.unconfirmed.values())]
+            if futures:
+                await asyncio.gather(*futures)
+        return await make_request(bot, method)
+
+
+async def supervise_worker(index: int, script: str):
+    """Запуск воркера и его перезапуск при падении"""
+    while True:
+        process = await asyncio.create_subprocess_exec(sys.executable, script, '--worker', str(index))
+        logger.info(f"Воркер {index} запущен (pid {process.pid})")
+        try:
+            code = await process.wait()
+        except asyncio.CancelledError:
+            # Остановка фронта: воркер завершает уже полученные обновления
+            if process.returncode is None:
+                process.terminate()
+                await process.wait()
+            raise
+
+        logger.error(f"Воркер {index} завершился с кодом {code}, перезапуск через {RESTART_DELAY} с")
+        await asyncio.sleep(RESTART_DELAY)
+
+
+async def run_front(bot: Bot, allowed_updates: list[str], workers: int, socket_dir: str, script: str):
+    """Фронтальный процесс: получение обновлений и распределение по воркерам"""
+    os.makedirs(socket_dir, exist_ok=True)
+
+    supervisors = [asyncio.create_task(supervise_worker(index, script)) for index in range(workers)]
+    connections = [WorkerConnection(index, get_socket_path(socket_dir, index)) for index in range(workers)]
+    for connection in connections:
+        connection.start()
+
+    front_dp = Dispatcher()
+    front_dp.update.outer_middleware(FrontRouterMiddleware(connections))
+    bot.session.middleware(ConfirmBeforePollingMiddleware(connections))
+
+    logger.info(f"Фронтальный процесс запущен, воркеров: {workers}")
+
+    try:
+        await front_dp.start_polling(bot, handle_as_tasks=False, allowed_updates=allowed_updates)
+    finally:
+        for connection in connections:
+            await connection.stop()
+        for supervisor in supervisors:
+            supervisor.cancel()
+        await asyncio.gather(*supervisors, return_exceptions=True)
+        logger.info("Фронтальный процесс остановлен")
+
+
+# ============== ПРОЦЕСС-ВОРКЕР ==============
+
+async def run_worker(index: int, bot: Bot, dp: Dispatcher, journal: UpdateJournal, socket_dir: str):
+    """
+    Воркер: приём обновлений от фронта и обработка обработчиками bot.py
+    Подтверждение отправляется фронту после записи обновления в журнал воркера
+    """
+    socket_path = get_socket_path(socket_dir, index)
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+    # Повторная обработка обновлений, не завершённых до перезапуска воркера
+    replayed = await journal.replay(dp, bot)
+    if replayed:
+        logger.info(f"Воркер {index}: повторно обработано обновлений: {replayed}")
+
+    async def handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        received: list[int] = []
+        has_received = asyncio.Event()
+
+        async def send_confirmations():
+            # Подтверждения отправляются группой после одного fsync журнала; список берётся
+            # до записи: обновления, полученные во время fsync, ещё не на диске
+            while True:
+                await has_received.wait()
+                has_received.clear()
+                confirmed, received[:] = received[:], []
+                await journal.flush()
+                writer.write(''.join(json.dumps({'id': update_id}) + '\n' for update_id in confirmed).encode())
+                await writer.drain()
+
+        confirmations = asyncio.create_task(send_confirmations())
+        try:
+            while line := await reader.readline():
+                message = json.loads(line)
+                update = Update.model_validate(message['update'], context={'bot': bot})
+                await dp.feed_update(bot, update)
+                received.append(message['id'])
+                has_received.set()
+        except (ConnectionError, OSError, asyncio.CancelledError):
+            # Обрыв соединения или остановка воркера
+            pass
+        finally:
+            confirmations.cancel()
+            writer.close()
+
+    server = await asyncio.start_unix_server(handle_connection, path=socket_path)
+    logger.info(f"Воркер {index} слушает {socket_path}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    async with server:
+        await stop.wait()
+
+    logger.info(f"Воркер {index} останавливается")
@@ -13,9 +13,57 @@ BOT_TOKEN = os.getenv('BOT_TOKEN')
 # ID администратора
 ADMIN_ID = int(os.getenv('ADMIN_ID', 0))
 
+# Пул модераторов: ADMIN_ID и/или список ID через запятую в ADMIN_IDS
+# (порядок сохраняется, дубликаты отбрасываются)
+MODERATOR_IDS = tuple(dict.fromkeys(
+    ([ADMIN_ID] if ADMIN_ID else []) +
+    [int(admin_id) for admin_id in os.getenv('ADMIN_IDS', '').split(',') if admin_id.strip()]
+))
+
+# Множество ID модераторов для проверки прав за O(1)
+ADMIN_IDS = frozenset(MODERATOR_IDS)
+
 # ID канала для публикации
 CHANNEL_ID = os.getenv('CHANNEL_ID')
 
+# Дополнительные каналы и чаты для публикации ответов через запятую
+# (ответы всегда публикуются в CHANNEL_ID и дублируются в PUBLISH_TARGETS)
+PUBLISH_TARGETS = tuple(dict.fromkeys(
+    target.strip() for target in [CHANNEL_ID or '', *os.getenv('PUBLISH_TARGETS', '').split(',')]
+    if target.strip()
+))
+
+# Максимальное количество каналов, в которые публикация идёт одновременно
+PUBLISH_CONCURRENCY = int(os.getenv('PUBLISH_CONCURRENCY', 5))
+
+# Количество воркеров обработки обновлений (обновления одного пользователя
+# всегда обрабатываются одним воркером по порядку)
+UPDATE_WORKERS = int(os.getenv('UPDATE_WORKERS', 8))
+
+# Размер очереди каждого воркера; при заполнении получение обновлений приостанавливается
+UPDATE_QUEUE_SIZE = int(os.getenv('UPDATE_QUEUE_SIZE', 100))
+
+# Файл журнала обновлений (незавершённые обновления обрабатываются повторно после перезапуска)
+JOURNAL_FILE = os.getenv('JOURNAL_FILE', 'updates.journal')
+
+# Количество процессов-воркеров (больше 1 — многопроцессный режим: фронтальный процесс
+# получает обновления и распределяет их по воркерам по ID пользователя)
+BOT_WORKERS = int(os.getenv('BOT_WORKERS', 1))
+
+# Каталог для Unix-сокетов воркеров в многопроцессном режиме
+CLUSTER_SOCKET_DIR = os.getenv('CLUSTER_SOCKET_DIR', 'run')
+
+# Секрет для хеширования ID пользователей (HMAC); если задан, вопросы связываются
+# с хешем автора — работает команда /my и уведомления о публикации ответа
+USER_HASH_SECRET = os.getenv('USER_HASH_SECRET', '')
+
+# Максимальное количество уведомлений пользователям в секунду
+NOTIFY_RATE = int(os.getenv('NOTIFY_RATE', 20))
+
+# Срок хранения уведомлений о неопубликованных вопросах, дней
+# (по истечении зашифрованный ID чата автора удаляется)
+NOTIFY_TTL_DAYS = int(os.getenv('NOTIFY_TTL_DAYS', 30))
+
 # Максимальная длина вопроса
 MAX_QUESTION_LENGTH = 1000
 
@@ -23,8 +71,11 @@ MAX_QUESTION_LENGTH = 1000
 if not BOT_TOKEN:
     raise ValueError("BOT_TOKEN не установлен в .env файле")
 
+if not MODERATOR_IDS:
+    raise ValueError("ADMIN_ID или ADMIN_IDS не установлен в .env файле")
+
 if not ADMIN_ID:
-    raise ValueError("ADMIN_ID не установлен в .env файле")
+    ADMIN_ID = MODERATOR_IDS[0]
 
 if not CHANNEL_ID:
     raise ValueError("CHANNEL_ID не установлен в .env файле")
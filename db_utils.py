@@ -2,10 +2,19 @@
 """
 Утилита для управления базой данных вопросов
 """
+import bz2
+import csv
+import gzip
+import json
+import lzma
 import sys
+import time
 from datetime import datetime
 
-from models import Question, init_db
+from peewee import chunked
+
+from models import Question, db, init_db
+from utils import format_duration
 
 
 def show_stats():
@@ -115,25 +124,74 @@ def clear_old_questions(days=30):
         print("❌ Удаление отменено")
 
 
+# Поля вопроса при экспорте и импорте в JSONL/CSV
+EXPORT_FIELDS = (
+    'id', 'text', 'status', 'video_file_id', 'created_at',
+    'moderator_id', 'moderated_at', 'published_at', 'user_hash', 'video_unique_id'
+)
+
+# Сжатие определяется по расширению файла
+COMPRESSION_OPENERS = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open}
+
+
+def open_data_file(filename, mode):
+    """Открытие файла с прозрачным сжатием (.gz, .bz2, .xz) в текстовом режиме"""
+    for extension, opener in COMPRESSION_OPENERS.items():
+        if filename.endswith(extension):
+            return opener(filename, mode + 't', encoding='utf-8', newline='')
+    return open(filename, mode, encoding='utf-8', newline='')
+
+
+def get_data_format(filename):
+    """Формат файла (jsonl, csv или txt) по расширению без учёта сжатия"""
+    for extension in COMPRESSION_OPENERS:
+        if filename.endswith(extension):
+            filename = filename[:-len(extension)]
+            break
+
+    if filename.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    if filename.endswith('.csv'):
+        return 'csv'
+    return 'txt'
+
+
 def export_questions(filename='questions_export.txt'):
-    """Экспорт всех вопросов в текстовый файл"""
+    """Экспорт всех вопросов в текстовый файл, JSONL или CSV (формат по расширению)"""
     init_db()
 
     questions = Question.select().order_by(Question.created_at)
+    data_format = get_data_format(filename)
 
     try:
-        with open(filename, 'w', encoding='utf-8') as f:
-            f.write("ЭКСПОРТ ВОПРОСОВ\n")
-            f.write("=" * 80 + "\n\n")
-
-            for q in questions:
-                f.write(f"ID: {q.id}\n")
-                f.write(f"Дата: {q.created_at}\n")
-                f.write(f"Статус: {q.status}\n")
-                f.write(f"Вопрос: {q.text}\n")
-                if q.video_file_id:
-                    f.write(f"Видео ID: {q.video_file_id}\n")
-                f.write("\n" + "-" * 80 + "\n\n")
+        if data_format == 'txt':
+            with open(filename, 'w', encoding='utf-8') as f:
+                f.write("ЭКСПОРТ ВОПРОСОВ\n")
+                f.write("=" * 80 + "\n\n")
+
+                for q in questions:
+                    f.write(f"ID: {q.id}\n")
+                    f.write(f"Дата: {q.created_at}\n")
+                    f.write(f"Статус: {q.status}\n")
+                    f.write(f"Вопрос: {q.text}\n")
+                    if q.video_file_id:
+                        f.write(f"Видео ID: {q.video_file_id}\n")
+                    f.write("\n" + "-" * 80 + "\n\n")
+        else:
+            # Построчная выгрузка без загрузки всей таблицы в память
+            rows = (Question
+                    .select(*[getattr(Question, field) for field in EXPORT_FIELDS])
+                    .order_by(Question.created_at)
+                    .dicts()
+                    .iterator())
+            with open_data_file(filename, 'w') as f:
+                if data_format == 'jsonl':
+                    for row in rows:
+                        f.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+                else:
+                    writer = csv.DictWriter(f, fieldnames=EXPORT_FIELDS)
+                    writer.writeheader()
+                    writer.writerows(rows)
 
         print(f"✅ Экспорт завершен: {filename}")
         print(f"   Экспортировано вопросов: {questions.count()}")
@@ -142,6 +200,178 @@ def export_questions(filename='questions_export.txt'):
         print(f"❌ Ошибка при экспорте: {e}")
 
 
+def read_import_rows(filename):
+    """Построчное чтение вопросов из JSONL или CSV (память не зависит от размера файла)"""
+    data_format = get_data_format(filename)
+    if data_format == 'txt':
+        raise ValueError("Поддерживаются только файлы .jsonl и .csv (можно сжатые .gz, .bz2, .xz)")
+
+    with open_data_file(filename, 'r') as f:
+        records = (json.loads(line) for line in f if line.strip()) if data_format == 'jsonl' else csv.DictReader(f)
+
+        for record in records:
+            yield normalize_import_row(record)
+
+
+def normalize_import_row(record):
+    """Приведение записи импорта к значениям полей модели Question"""
+    row = {}
+    for field in EXPORT_FIELDS:
+        value = record.get(field)
+        if value == '':
+            value = None
+
+        if value is not None:
+            if field == 'moderator_id':
+                value = int(value)
+            elif field.endswith('_at'):
+                # Формат хранения даты, который использует peewee для SQLite
+                value = str(datetime.fromisoformat(value) if isinstance(value, str) else value)
+
+        row[field] = value
+
+    if not row['id'] or row['text'] is None:
+        raise ValueError(f"В записи нет обязательных полей id и text: {record}")
+
+    row['status'] = row['status'] or 'pending'
+    row['created_at'] = row['created_at'] or str(datetime.now())
+    return row
+
+
+def build_insert_sql(mode: str = None) -> str:
+    """
+    Подготовленный INSERT вопроса с параметрами строго в порядке EXPORT_FIELDS
+    (insert с dict упорядочивает столбцы по модели, а не по EXPORT_FIELDS)
+    mode: None — обычная вставка, 'skip' — пропуск существующих ID, 'upsert' — обновление
+    """
+    fields = [getattr(Question, field) for field in EXPORT_FIELDS]
+    query = Question.insert_many([[None] * len(fields)], fields=fields)
+    if mode == 'upsert':
+        query = query.on_conflict(conflict_target=[Question.id],
+                                  preserve=[field for field in fields if field is not Question.id])
+    elif mode == 'skip':
+        query = query.on_conflict_ignore()
+
+    sql, _ = query.sql()
+    return sql
+
+
+def import_questions(filename, mode='skip', batch_size=50000):
+    """
+    Импорт вопросов из JSONL или CSV
+    mode: skip — пропускать вопросы с существующим ID, upsert — обновлять их
+    """
+    if mode not in ('skip', 'upsert'):
+        print(f"❌ Неизвестный режим импорта: {mode} (используйте skip или upsert)")
+        return
+
+    init_db()
+
+    # Один подготовленный INSERT для всех строк: построение SQL средствами ORM
+    # для каждой строки обходится дороже самой вставки
+    sql = build_insert_sql(mode)
+
+    count_before = Question.select().count()
+    processed = 0
+    started_at = time.perf_counter()
+
+    synchronous = db.pragma('synchronous')
+    try:
+        # Индексы пересоздаются после загрузки, запись на диск без ожидания fsync
+        Question._schema.drop_indexes(safe=True)
+        db.pragma('synchronous', 0)
+
+        for batch in chunked(read_import_rows(filename), batch_size):
+            with db.atomic():
+                db.cursor().executemany(sql, [[row[field] for field in EXPORT_FIELDS] for row in batch])
+
+            processed += len(batch)
+            elapsed = time.perf_counter() - started_at
+            print(f"   Обработано {processed} строк ({processed / elapsed:.0f} строк/с)", end='\r')
+
+    except Exception as e:
+        print(f"\n❌ Ошибка при импорте (после {processed} строк): {e}")
+        return
+
+    finally:
+        db.pragma('synchronous', synchronous)
+        print("\n   Пересоздание индексов...")
+        Question._schema.create_indexes(safe=True)
+
+    elapsed = time.perf_counter() - started_at
+    added = Question.select().count() - count_before
+
+    print(f"✅ Импорт завершен: {filename}")
+    print(f"   Обработано строк:    {processed}")
+    print(f"   Добавлено вопросов:  {added}")
+    if mode == 'upsert':
+        print(f"   Обновлено вопросов:  {processed - added}")
+    else:
+        print(f"   Пропущено (уже есть): {processed - added}")
+    print(f"   Время: {elapsed:.1f} с ({processed / elapsed if elapsed else 0:.0f} строк/с)")
+    print("   Для обновления аналитики выполните: python db_utils.py analytics rebuild")
+
+
+def show_moderators():
+    """Показать нагрузку и время обработки вопросов по модераторам"""
+    init_db()
+
+    import moderators
+
+    print("\n" + "=" * 80)
+    print("👥 Модераторы")
+    print("=" * 80)
+    print(f"{'ID':<15} {'Ожидают':>8} {'В очереди':>10} {'Обработано':>11} {'Среднее':>14} {'Максимум':>14}")
+
+    for stats in moderators.get_stats():
+        print(
+            f"{stats['moderator_id']:<15} {stats['pending']:>8} {stats['queued']:>10} {stats['handled']:>11} "
+            f"{format_duration(stats['avg_handling_seconds']):>14} "
+            f"{format_duration(stats['max_handling_seconds']):>14}"
+        )
+    print("=" * 80 + "\n")
+
+
+def show_analytics(days=30):
+    """Показать объём вопросов по дням и перцентили времени модерации и публикации"""
+    init_db()
+
+    import analytics
+
+    report = analytics.get_report(days)
+
+    print("\n" + "=" * 70)
+    print(f"📈 Аналитика за последние {days} дней")
+    print("=" * 70)
+    print(f"{'Метрика':<22} {'Кол-во':>8} {'p50':>12} {'p90':>12} {'p99':>12}")
+
+    titles = {'moderation': 'Время до модерации', 'publish': 'Время до публикации'}
+    for metric, stats in report['latency'].items():
+        # Перцентиль — верхняя граница интервала гистограммы
+        values = [
+            '> 30 дн' if value == float('inf') else f"≤ {format_duration(value)}" if value else "—"
+            for value in (stats['p50'], stats['p90'], stats['p99'])
+        ]
+        print(f"{titles[metric]:<22} {stats['count']:>8} {values[0]:>12} {values[1]:>12} {values[2]:>12}")
+
+    print("-" * 70)
+    print(f"{'Дата':<12} {'Новые':>10} {'Принято':>10} {'Отклонено':>10} {'Опубликовано':>13}")
+    for day, counts in report['daily'].items():
+        print(f"{day:<12} {counts['created']:>10} {counts['approved']:>10} "
+              f"{counts['rejected']:>10} {counts['published']:>13}")
+    print("=" * 70 + "\n")
+
+
+def rebuild_analytics():
+    """Пересчитать агрегаты аналитики по всей базе"""
+    init_db()
+
+    import analytics
+
+    analytics.rebuild()
+    print("✅ Агрегаты аналитики пересчитаны")
+
+
 def show_help():
     """Показать справку по командам"""
     help_text = """
@@ -157,7 +387,14 @@ def show_help():
         delete <question_id>           - Удалить вопрос по ID
         clear [days]                   - Удалить старые отклоненные вопросы
                                          days: количество дней (по умолчанию 30)
-        export [filename]              - Экспорт в текстовый файл
+        export [filename]              - Экспорт в файл (формат по расширению:
+                                         .txt, .jsonl, .csv; сжатие .gz, .bz2, .xz)
+        import <filename> [mode]       - Импорт из .jsonl или .csv (можно сжатых)
+                                         mode: skip (по умолчанию) или upsert
+        moderators                     - Нагрузка и время обработки модераторов
+        analytics [days]               - Объём и время модерации/публикации
+                                         days: период в днях (по умолчанию 30)
+        analytics rebuild              - Пересчитать агрегаты по всей базе
         help                           - Показать эту справку
     
     Примеры:
@@ -166,6 +403,10 @@ def show_help():
         python db_utils.py delete abc-123-def
         python db_utils.py clear 60
         python db_utils.py export my_export.txt
+        python db_utils.py export backup.jsonl.gz
+        python db_utils.py import backup.jsonl.gz upsert
+        python db_utils.py moderators
+        python db_utils.py analytics 7
     """
     print(help_text)
 
@@ -201,6 +442,23 @@ def main():
         filename = sys.argv[2] if len(sys.argv) > 2 else 'questions_export.txt'
         export_questions(filename)
 
+    elif command == 'import':
+        if len(sys.argv) < 3:
+            print("❌ Укажите файл для импорта")
+            return
+        mode = sys.argv[3] if len(sys.argv) > 3 else 'skip'
+        import_questions(sys.argv[2], mode)
+
+    elif command == 'moderators':
+        show_moderators()
+
+    elif command == 'analytics':
+        if len(sys.argv) > 2 and sys.argv[2] == 'rebuild':
+            rebuild_analytics()
+        else:
+            days = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+            show_analytics(days)
+
     elif command == 'help':
         show_help()
 
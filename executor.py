@@ -0,0 +1,144 @@
+"""
+Исполнитель обновлений с сохранением порядка для каждого пользователя
+
+Обновления распределяются по фиксированному набору воркеров (шардов) по ID
+пользователя: сообщения одного пользователя всегда обрабатываются одним воркером
+строго по очереди, а разные пользователи обслуживаются параллельно. Очередь каждого
+шарда ограничена — при её заполнении получение новых обновлений приостанавливается.
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+from loguru import logger
+
+
+class ShardStats:
+    """Метрики одного шарда"""
+
+    def __init__(self):
+        self.processed = 0  # Обработано обновлений
+        self.errors = 0  # Обновлений, завершившихся исключением
+        self.max_depth = 0  # Максимальная глубина очереди
+        self.wait_time = 0.0  # Суммарное время ожидания в очереди, с
+        self.handle_time = 0.0  # Суммарное время обработки, с
+
+
+class UpdateExecutor(BaseMiddleware):
+    """
+    Outer-middleware диспетчера, которое передаёт обработку обновления воркеру шарда
+    Регистрируется через dp.update.outer_middleware(); polling нужно запускать
+    с handle_as_tasks=False, чтобы заполненная очередь останавливала получение обновлений
+    """
+
+    def __init__(self, workers: int = 8, queue_size: int = 100):
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self._queues: list[asyncio.Queue] = []
+        self._tasks: list[asyncio.Task] = []
+        self._stats = [ShardStats() for _ in range(self.workers)]
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def shard_for(self, user_id: int) -> int:
+        """Номер шарда для пользователя"""
+        return user_id % self.workers
+
+    async def start(self):
+        """Запуск воркеров"""
+        if self.running:
+            return
+
+        self._queues = [asyncio.Queue(maxsize=self.queue_size) for _ in range(self.workers)]
+        self._tasks = [
+            asyncio.create_task(self._worker(shard), name=f"update-worker-{shard}")
+            for shard in range(self.workers)
+        ]
+        logger.info(f"Исполнитель обновлений запущен: {self.workers} воркеров, очередь {self.queue_size}")
+
+    async def join(self):
+        """Ожидание обработки всех поставленных в очередь обновлений"""
+        await asyncio.gather(*(queue.join() for queue in self._queues))
+
+    async def stop(self, timeout: float = 30):
+        """Остановка воркеров после обработки уже полученных обновлений"""
+        if not self.running:
+            return
+
+        try:
+            await asyncio.wait_for(self.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Не все обновления обработаны за {timeout} с до остановки")
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("Исполнитель обновлений остановлен")
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: dict[str, Any]
+    ) -> Any:
+        if not self.running:
+            return await handler(event, data)
+
+        user = data.get("event_from_user")
+        chat = data.get("event_chat")
+        if user:
+            key = user.id
+        elif chat:
+            key = chat.id
+        else:
+            key = event.update_id if isinstance(event, Update) else 0
+
+        shard = self.shard_for(key)
+        queue = self._queues[shard]
+
+        # При заполненной очереди put() ждёт, и polling не запрашивает новые обновления
+        await queue.put((handler, event, data, time.monotonic()))
+
+        stats = self._stats[shard]
+        stats.max_depth = max(stats.max_depth, queue.qsize())
+
+    async def _worker(self, shard: int):
+        """Последовательная обработка обновлений одного шарда"""
+        queue = self._queues[shard]
+        stats = self._stats[shard]
+
+        while True:
+            handler, event, data, enqueued_at = await queue.get()
+            started_at = time.monotonic()
+            try:
+                await handler(event, data)
+            except Exception as e:
+                stats.errors += 1
+                logger.exception(f"Ошибка при обработке обновления в воркере {shard}: {e}")
+            finally:
+                finished_at = time.monotonic()
+                stats.processed += 1
+                stats.wait_time += started_at - enqueued_at
+                stats.handle_time += finished_at - started_at
+                queue.task_done()
+
+    def get_stats(self) -> list[dict]:
+        """Метрики очередей по шардам"""
+        result = []
+        for shard, stats in enumerate(self._stats):
+            processed = stats.processed or 1
+            result.append({
+                'shard': shard,
+                'depth': self._queues[shard].qsize() if self._queues else 0,
+                'max_depth': stats.max_depth,
+                'processed': stats.processed,
+                'errors': stats.errors,
+                'avg_wait_ms': stats.wait_time / processed * 1000,
+                'avg_handle_ms': stats.handle_time / processed * 1000,
+            })
+        return result
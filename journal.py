@@ -0,0 +1,304 @@
+"""
+Журнал обновлений для перезапуска без потери сообщений
+
+Каждое полученное обновление дописывается в локальный файл до того, как Telegram
+получит подтверждение (следующий запрос getUpdates), а после обработки помечается
+выполненным. Записи копятся в буфере и сбрасываются на диск группой с одним fsync.
+При запуске незавершённые обновления обрабатываются повторно до начала polling.
+Периодически журнал сжимается: в нём остаются незавершённые обновления и окно
+недавно обработанных ID.
+
+Повторно присланные Telegram обновления распознаются по незавершённым и недавно
+обработанным ID, а не по максимальному ID: после недели без обновлений Telegram
+выбирает следующий update_id случайно, и он может оказаться меньше прежних.
+
+Формат файла — JSON по строке на запись:
+    {"op": "add", "id": <update_id>, "update": {...}}  — обновление получено
+    {"op": "done", "id": <update_id>}                  — обновление обработано
+"""
+import asyncio
+import collections
+import json
+import os
+import time
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.methods import GetUpdates
+from aiogram.types import TelegramObject, Update
+from loguru import logger
+
+
+class UpdateJournal:
+    """Журнал обновлений с групповой записью на диск"""
+
+    def __init__(self, path: str = 'updates.journal', flush_interval: float = 0.05,
+                 compact_interval: float = 300, compact_threshold: int = 1000,
+                 dedupe_window: int = 10000):
+        self.path = path
+        self.flush_interval = flush_interval  # Период сброса отметок о выполнении, с
+        self.compact_interval = compact_interval  # Период проверки необходимости сжатия, с
+        self.compact_threshold = compact_threshold  # Сжимать, если выполненных записей больше
+
+        self.pending: dict[int, dict] = {}  # Незавершённые обновления: update_id -> обновление
+
+        # Окно недавно обработанных ID для распознавания повторно присланных обновлений
+        self._recent_done: collections.deque[int] = collections.deque(maxlen=dedupe_window)
+        self._recent_done_ids: set[int] = set()
+
+        self._file = None
+        self._buffer: list[str] = []
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        self._done_since_compact = 0
+
+        # Метрики
+        self.appended = 0  # Записано обновлений
+        self.flushes = 0  # Групповых записей на диск
+        self.flush_time = 0.0  # Суммарное время записи и fsync, с
+        self.replayed = 0  # Повторно обработано при запуске
+        self.replay_time = 0.0  # Время повторной обработки, с
+
+    def open(self):
+        """Чтение журнала с диска и открытие файла для дозаписи"""
+        if os.path.exists(self.path):
+            complete_size = 0  # Размер файла до конца последней полной строки
+            with open(self.path, 'rb') as f:
+                for raw_line in f:
+                    if not raw_line.endswith(b'\n'):
+                        # Недописанная строка при аварийной остановке — будет обрезана
+                        logger.warning(f"Обрезана недописанная запись журнала: {raw_line[:100]!r}")
+                        break
+                    complete_size += len(raw_line)
+
+                    try:
+                        record = json.loads(raw_line)
+                    except (json.JSONDecodeError, UnicodeDecodeError):
+                        logger.warning(f"Пропущена повреждённая запись журнала: {raw_line[:100]!r}")
+                        continue
+
+                    # Записи {"op": "max"} прошлых версий журнала пропускаются
+                    update_id = record['id']
+                    if record['op'] == 'add':
+                        self.pending[update_id] = record['update']
+                    elif record['op'] == 'done':
+                        self.pending.pop(update_id, None)
+                        self._remember_done(update_id)
+                        self._done_since_compact += 1
+
+            # Без обрезки следующая запись склеилась бы с недописанной строкой
+            if complete_size < os.path.getsize(self.path):
+                os.truncate(self.path, complete_size)
+
+        self._file = open(self.path, 'a', encoding='utf-8')
+        logger.info(f"Журнал обновлений открыт: {self.path}, незавершённых обновлений: {len(self.pending)}")
+
+    async def start(self):
+        """Запуск фоновой записи и сжатия журнала"""
+        if self._file is None:
+            self.open()
+        self._task = asyncio.create_task(self._background(), name="update-journal")
+
+    async def close(self):
+        """Остановка фоновой задачи, запись буфера и закрытие файла"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+        await self.flush()
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def record_arrival(self, update: Update, replay: bool = False) -> bool:
+        """
+        Отметка о получении обновления
+        Возвращает False для дубликата: Telegram повторно прислал обновление,
+        которое уже обработано или обрабатывается повторно после перезапуска
+        """
+        update_id = update.update_id
+
+        if update_id in self.pending:
+            # При повторной обработке запись уже есть в журнале
+            return replay
+
+        if update_id in self._recent_done_ids:
+            return False
+
+        raw = update.model_dump(mode='json', exclude_none=True, by_alias=True)
+        self.pending[update_id] = raw
+        self._buffer.append(json.dumps({'op': 'add', 'id': update_id, 'update': raw}, ensure_ascii=False))
+        self.appended += 1
+        return True
+
+    def record_done(self, update_id: int):
+        """Отметка об обработке обновления"""
+        if self.pending.pop(update_id, None) is None:
+            return
+
+        self._buffer.append(json.dumps({'op': 'done', 'id': update_id}))
+        self._remember_done(update_id)
+        self._done_since_compact += 1
+
+    def _remember_done(self, update_id: int):
+        """Добавление ID в окно недавно обработанных (самый старый ID вытесняется)"""
+        if update_id in self._recent_done_ids:
+            return
+        if len(self._recent_done) == self._recent_done.maxlen:
+            self._recent_done_ids.discard(self._recent_done[0])
+        self._recent_done.append(update_id)
+        self._recent_done_ids.add(update_id)
+
+    async def flush(self):
+        """Запись накопленных записей на диск одной группой с fsync"""
+        async with self._lock:
+            if not self._buffer or self._file is None:
+                return
+
+            lines, self._buffer = self._buffer, []
+            started_at = time.perf_counter()
+            await asyncio.to_thread(self._write, lines)
+            self.flush_time += time.perf_counter() - started_at
+            self.flushes += 1
+
+    def _write(self, lines: list[str]):
+        self._file.write('\n'.join(lines) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    async def compact(self):
+        """Перезапись журнала: остаются незавершённые обновления и окно недавно обработанных ID"""
+        async with self._lock:
+            if self._buffer:
+                lines, self._buffer = self._buffer, []
+                await asyncio.to_thread(self._write, lines)
+
+            records = [json.dumps({'op': 'done', 'id': update_id}) for update_id in self._recent_done]
+            records.extend(
+                json.dumps({'op': 'add', 'id': update_id, 'update': raw}, ensure_ascii=False)
+                for update_id, raw in sorted(self.pending.items())
+            )
+            await asyncio.to_thread(self._rewrite, records)
+            self._done_since_compact = 0
+
+        logger.info(f"Журнал обновлений сжат, незавершённых обновлений: {len(self.pending)}")
+
+    def _rewrite(self, records: list[str]):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(records) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+        self._file.close()
+        os.replace(tmp_path, self.path)
+
+        # fsync каталога, чтобы переименование пережило сбой питания
+        directory = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    async def _background(self):
+        """Периодическая запись отметок о выполнении и сжатие журнала"""
+        last_compact = time.monotonic()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                if (self._done_since_compact >= self.compact_threshold and
+                        time.monotonic() - last_compact >= self.compact_interval):
+                    await self.compact()
+                    last_compact = time.monotonic()
+            except Exception as e:
+                logger.error(f"Ошибка при записи журнала обновлений: {e}")
+
+    async def replay(self, dp: Dispatcher, bot: Bot) -> int:
+        """Повторная обработка незавершённых обновлений (до запуска polling)"""
+        updates = sorted(self.pending.items())
+        if not updates:
+            return 0
+
+        logger.info(f"Повторная обработка незавершённых обновлений: {len(updates)}")
+        started_at = time.perf_counter()
+
+        for update_id, raw in updates:
+            try:
+                await dp.feed_update(bot, Update.model_validate(raw, context={'bot': bot}), journal_replay=True)
+            except Exception as e:
+                logger.error(f"Ошибка при повторной обработке обновления {update_id}: {e}")
+                self.record_done(update_id)
+
+        self.replayed += len(updates)
+        self.replay_time += time.perf_counter() - started_at
+        return len(updates)
+
+    def get_stats(self) -> dict:
+        """Метрики журнала"""
+        return {
+            'pending': len(self.pending),
+            'appended': self.appended,
+            'flushes': self.flushes,
+            'avg_batch': self.appended / self.flushes if self.flushes else 0,
+            'avg_flush_ms': self.flush_time / self.flushes * 1000 if self.flushes else 0,
+            'replayed': self.replayed,
+            'replay_rate': self.replayed / self.replay_time if self.replay_time else 0,
+        }
+
+
+class JournalArrivalMiddleware(BaseMiddleware):
+    """Запись обновления в журнал при получении (регистрируется до UpdateExecutor)"""
+
+    def __init__(self, journal: UpdateJournal):
+        self.journal = journal
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: dict[str, Any]
+    ) -> Any:
+        if not self.journal.record_arrival(event, replay=data.get('journal_replay', False)):
+            logger.info(f"Пропущено повторно полученное обновление {event.update_id}")
+            return None
+        return await handler(event, data)
+
+
+class JournalCompletionMiddleware(BaseMiddleware):
+    """Отметка о выполнении после обработки (регистрируется после UpdateExecutor)"""
+
+    def __init__(self, journal: UpdateJournal):
+        self.journal = journal
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: dict[str, Any]
+    ) -> Any:
+        try:
+            return await handler(event, data)
+        finally:
+            # Упавшее обновление тоже считается выполненным, чтобы не повторять его бесконечно
+            self.journal.record_done(event.update_id)
+
+
+class JournalFlushMiddleware(BaseRequestMiddleware):
+    """
+    Запись журнала на диск перед каждым getUpdates
+    Запрос getUpdates подтверждает Telegram получение предыдущих обновлений,
+    поэтому к этому моменту они уже должны быть на диске
+    """
+
+    def __init__(self, journal: UpdateJournal):
+        self.journal = journal
+
+    async def __call__(self, make_request, bot: Bot, method):
+        if isinstance(method, GetUpdates):
+            await self.journal.flush()
+        return await make_request(bot, method)
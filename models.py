@@ -4,11 +4,20 @@
 import datetime
 
 from peewee import (
-    Model, CharField, TextField, DateTimeField, SqliteDatabase
+    Model, CharField, TextField, DateTimeField, BigIntegerField, IntegerField,
+    BooleanField, ForeignKeyField, SqliteDatabase
 )
+from playhouse.migrate import SqliteMigrator, migrate
 
 # Инициализация базы данных
-db = SqliteDatabase('questions.db')
+# WAL позволяет нескольким процессам бота читать во время записи,
+# busy_timeout — ждать освобождения блокировки записи другим процессом (мс),
+# foreign_keys — включает ON DELETE CASCADE (в SQLite по умолчанию выключено)
+db = SqliteDatabase('questions.db', pragmas={
+    'journal_mode': 'wal',
+    'busy_timeout': 10000,
+    'foreign_keys': 1,
+})
 
 
 class Question(Model):
@@ -17,17 +26,129 @@ class Question(Model):
     text = TextField()  # Текст вопроса
     status = CharField(default='pending')  # Статус: pending, approved, rejected
     video_file_id = CharField(null=True)  # file_id кружочка (может быть пустым)
+    video_unique_id = CharField(null=True, index=True)  # file_unique_id кружочка (повторно не публикуется)
     created_at = DateTimeField(default=datetime.datetime.now)  # Дата и время создания
+    moderator_id = BigIntegerField(null=True)  # Telegram ID модератора, которому назначен вопрос
+    moderated_at = DateTimeField(null=True)  # Дата и время принятия или отклонения
+    published_at = DateTimeField(null=True)  # Дата и время публикации ответа
+    user_hash = CharField(null=True)  # Ключевой хеш ID автора (только при заданном USER_HASH_SECRET)
 
     class Meta:
         database = db
         table_name = 'questions'
+        indexes = (
+            (('moderator_id', 'status'), False),  # Подсчёт нагрузки модераторов
+            (('user_hash', 'created_at'), False),  # Последние вопросы пользователя (/my)
+        )
+
+
+class AnswerQueue(Model):
+    """Очередь принятых вопросов, ожидающих видеоответа администратора"""
+    admin_id = BigIntegerField()  # Telegram ID администратора, который принял вопрос
+    question = ForeignKeyField(Question, backref='queue_entries', on_delete='CASCADE')  # Вопрос в очереди
+    position = IntegerField()  # Порядок в очереди (меньше — раньше)
+    created_at = DateTimeField(default=datetime.datetime.now)  # Дата и время постановки в очередь
+
+    class Meta:
+        database = db
+        table_name = 'answer_queue'
+        indexes = (
+            (('admin_id', 'position'), False),  # Быстрый поиск головы очереди
+            (('question',), True),  # Вопрос может стоять в очереди только один раз
+        )
+
+
+class Publication(Model):
+    """Результат публикации ответа в одном из каналов"""
+    question = ForeignKeyField(Question, backref='publications', on_delete='CASCADE')  # Опубликованный вопрос
+    target = CharField()  # ID канала или чата
+    success = BooleanField(default=False)  # Успешна ли публикация
+    message_id = IntegerField(null=True)  # ID сообщения с текстом вопроса в канале
+    error = TextField(null=True)  # Текст ошибки (если публикация не удалась)
+    published_at = DateTimeField(default=datetime.datetime.now)  # Дата и время последней попытки
+
+    class Meta:
+        database = db
+        table_name = 'publications'
+        indexes = (
+            (('question', 'target'), True),  # Одна запись на пару вопрос-канал
+        )
+
+
+class HourlyRollup(Model):
+    """Количество событий за час (поддерживается инкрементально)"""
+    hour = DateTimeField()  # Начало часа
+    event = CharField()  # Событие: created, approved, rejected, published
+    count = IntegerField(default=0)  # Количество событий
+
+    class Meta:
+        database = db
+        table_name = 'hourly_rollups'
+        indexes = (
+            (('hour', 'event'), True),
+        )
+
+
+class LatencyRollup(Model):
+    """Гистограмма задержек за час (поддерживается инкрементально)"""
+    hour = DateTimeField()  # Начало часа
+    metric = CharField()  # Метрика: moderation (создание -> модерация), publish (создание -> публикация)
+    bucket = IntegerField()  # Номер интервала гистограммы (см. analytics.LATENCY_BUCKETS)
+    count = IntegerField(default=0)  # Количество вопросов в интервале
+
+    class Meta:
+        database = db
+        table_name = 'latency_rollups'
+        indexes = (
+            (('hour', 'metric', 'bucket'), True),
+        )
+
+
+class Notification(Model):
+    """
+    Уведомление автора о публикации ответа
+    ID чата хранится зашифрованным и только до отправки уведомления, отклонения вопроса
+    или истечения срока хранения (NOTIFY_TTL_DAYS)
+    """
+    question = ForeignKeyField(Question, backref='notifications', on_delete='CASCADE')  # Вопрос автора
+    chat_id = CharField()  # Зашифрованный ID чата для уведомления (utils.encrypt_chat_id)
+    created_at = DateTimeField(default=datetime.datetime.now)  # Дата и время создания
+
+    class Meta:
+        database = db
+        table_name = 'notifications'
+        indexes = (
+            (('question',), True),  # Одно уведомление на вопрос
+        )
+
+
+MODELS = [Question, AnswerQueue, Publication, HourlyRollup, LatencyRollup, Notification]
+
+
+def migrate_db():
+    """Добавление недостающих столбцов в таблицы, созданные прошлыми версиями бота"""
+    migrator = SqliteMigrator(db)
+    operations = []
+
+    for model in MODELS:
+        table_name = model._meta.table_name
+        if not db.table_exists(table_name):
+            continue
+
+        columns = {column.name for column in db.get_columns(table_name)}
+        for field in model._meta.sorted_fields:
+            if field.column_name not in columns:
+                operations.append(migrator.add_column(table_name, field.column_name, field))
+
+    if operations:
+        migrate(*operations)
 
 
 def init_db():
     """Инициализация базы данных и создание таблиц"""
-    db.connect()
-    db.create_tables([Question], safe=True)
+    db.connect(reuse_if_open=True)
+    migrate_db()
+    db.create_tables(MODELS, safe=True)
     print("База данных инициализирована успешно")
 
 
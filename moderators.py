@@ -0,0 +1,108 @@
+"""
+Пул модераторов: распределение вопросов и метрики нагрузки
+
+Новый вопрос назначается наименее загруженному модератору, при равной нагрузке —
+по кругу. Нагрузка модератора — это назначенные ему вопросы в статусе pending
+плюс принятые вопросы в его очереди ответов.
+"""
+import itertools
+
+from peewee import fn
+
+from config import MODERATOR_IDS
+from models import AnswerQueue, Question
+
+# Счётчик для кругового выбора среди одинаково загруженных модераторов
+_round_robin = itertools.count()
+
+
+def get_pending_counts(moderator_ids=MODERATOR_IDS) -> dict[int, int]:
+    """Количество назначенных, но ещё не обработанных вопросов по модераторам"""
+    query = (Question
+             .select(Question.moderator_id, fn.COUNT(Question.id))
+             .where((Question.status == 'pending') &
+                    (Question.moderator_id.in_(list(moderator_ids))))
+             .group_by(Question.moderator_id)
+             .tuples())
+    return dict(query)
+
+
+def get_queued_counts(moderator_ids=MODERATOR_IDS) -> dict[int, int]:
+    """Количество вопросов в очередях ответов по модераторам"""
+    query = (AnswerQueue
+             .select(AnswerQueue.admin_id, fn.COUNT(AnswerQueue.id))
+             .join(Question)
+             .where(AnswerQueue.admin_id.in_(list(moderator_ids)))
+             .group_by(AnswerQueue.admin_id)
+             .tuples())
+    return dict(query)
+
+
+def get_load(moderator_ids=MODERATOR_IDS) -> dict[int, int]:
+    """Текущая нагрузка каждого модератора"""
+    pending = get_pending_counts(moderator_ids)
+    queued = get_queued_counts(moderator_ids)
+    return {
+        moderator_id: pending.get(moderator_id, 0) + queued.get(moderator_id, 0)
+        for moderator_id in moderator_ids
+    }
+
+
+def choose_moderator(moderator_ids=MODERATOR_IDS) -> int:
+    """Выбор модератора для нового вопроса"""
+    if len(moderator_ids) == 1:
+        return moderator_ids[0]
+
+    load = get_load(moderator_ids)
+    min_load = min(load.values())
+    candidates = [moderator_id for moderator_id in moderator_ids if load[moderator_id] == min_load]
+    return candidates[next(_round_robin) % len(candidates)]
+
+
+def get_fallback_order(exclude, moderator_ids=MODERATOR_IDS) -> list[int]:
+    """Остальные модераторы по возрастанию нагрузки (кому передать вопрос, если отправка не удалась)"""
+    others = [moderator_id for moderator_id in moderator_ids if moderator_id not in exclude]
+    if not others:
+        return []
+
+    load = get_load(others)
+    return sorted(others, key=lambda moderator_id: load[moderator_id])
+
+
+def get_stats(moderator_ids=MODERATOR_IDS) -> list[dict]:
+    """
+    Метрики модераторов: глубина очередей и время обработки
+    Время обработки — от создания вопроса до принятия или отклонения, в секундах
+    """
+    pending = get_pending_counts(moderator_ids)
+    queued = get_queued_counts(moderator_ids)
+
+    handling_seconds = (fn.julianday(Question.moderated_at) - fn.julianday(Question.created_at)) * 86400
+    handled = {
+        moderator_id: (count, avg_seconds, max_seconds)
+        for moderator_id, count, avg_seconds, max_seconds in (
+            Question
+            .select(Question.moderator_id,
+                    fn.COUNT(Question.id),
+                    fn.AVG(handling_seconds),
+                    fn.MAX(handling_seconds))
+            .where((Question.moderated_at.is_null(False)) &
+                   (Question.moderator_id.in_(list(moderator_ids))))
+            .group_by(Question.moderator_id)
+            .tuples()
+        )
+    }
+
+    stats = []
+    for moderator_id in moderator_ids:
+        count, avg_seconds, max_seconds = handled.get(moderator_id, (0, None, None))
+        stats.append({
+            'moderator_id': moderator_id,
+            'pending': pending.get(moderator_id, 0),
+            'queued': queued.get(moderator_id, 0),
+            'handled': count,
+            'avg_handling_seconds': avg_seconds,
+            'max_handling_seconds': max_seconds,
+        })
+    return stats
+
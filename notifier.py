@@ -0,0 +1,174 @@
+"""
+Уведомления авторов о публикации ответов
+
+После публикации ответа ID вопроса ставится в очередь. Фоновая задача забирает
+из очереди пакет вопросов, одним запросом читает их уведомления и отправляет их
+не чаще rate сообщений в секунду (лимит Telegram на рассылку — около 30 в секунду).
+Отправленные уведомления удаляются из базы одним запросом на пакет, а неотправленные
+из-за остановки бота снова ставятся в очередь при следующем запуске.
+
+ID чата автора хранится зашифрованным ключом, производным от USER_HASH_SECRET.
+Уведомления о вопросах, не опубликованных за ttl_days дней, удаляются раз в час.
+"""
+import asyncio
+import datetime
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from loguru import logger
+
+from models import Notification, Question
+from utils import decrypt_chat_id
+
+# Максимальное количество вопросов в одном пакете
+BATCH_SIZE = 100
+
+# Длина фрагмента вопроса в тексте уведомления
+PREVIEW_LENGTH = 50
+
+# Период удаления просроченных уведомлений, с
+PURGE_INTERVAL = 3600
+
+
+def get_preview(text: str) -> str:
+    """Начало вопроса для уведомления и списка /my"""
+    return text if len(text) <= PREVIEW_LENGTH else text[:PREVIEW_LENGTH].rstrip() + "…"
+
+
+class Notifier:
+    """Очередь уведомлений с ограничением скорости отправки"""
+
+    def __init__(self, bot: Bot, secret: str, rate: int = 20, ttl_days: int = 30):
+        self.bot = bot
+        self.secret = secret
+        self.interval = 1 / max(1, rate)
+        self.ttl_days = ttl_days
+        self.queue: asyncio.Queue[str] = asyncio.Queue()
+        self.sent = 0
+        self.failed = 0
+        self.purged = 0
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self, resume: bool = True):
+        """
+        Запуск фоновой отправки
+        resume — поставить в очередь уведомления об уже опубликованных ответах,
+        не отправленные до остановки (в многопроцессном режиме — только в одном процессе)
+        """
+        if resume:
+            query = (Notification
+                     .select(Notification.question)
+                     .join(Question)
+                     .where(Question.published_at.is_null(False))
+                     .tuples())
+            for (question_id,) in query:
+                self.queue.put_nowait(question_id)
+            if self.queue.qsize():
+                logger.info(f"Неотправленных уведомлений: {self.queue.qsize()}")
+
+        self._tasks = [
+            asyncio.create_task(self._run(), name="notifier"),
+            asyncio.create_task(self._purge_expired(), name="notifier-purge"),
+        ]
+
+    async def stop(self):
+        """Остановка отправки (оставшиеся уведомления будут отправлены после запуска)"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def enqueue(self, question_id: str):
+        """Постановка уведомления о публикации ответа в очередь"""
+        self.queue.put_nowait(question_id)
+
+    async def _run(self):
+        while True:
+            question_ids = [await self.queue.get()]
+            while len(question_ids) < BATCH_SIZE and not self.queue.empty():
+                question_ids.append(self.queue.get_nowait())
+
+            try:
+                await self.send_batch(question_ids)
+            except Exception as e:
+                logger.error(f"Ошибка при отправке уведомлений: {e}")
+
+    async def _purge_expired(self):
+        while True:
+            try:
+                self.purge_expired()
+            except Exception as e:
+                logger.error(f"Ошибка при удалении просроченных уведомлений: {e}")
+            await asyncio.sleep(PURGE_INTERVAL)
+
+    def purge_expired(self) -> int:
+        """Удаление уведомлений о вопросах, не опубликованных за ttl_days дней"""
+        cutoff = datetime.datetime.now() - datetime.timedelta(days=self.ttl_days)
+        # Перебираются только уведомления (их немного), вопросы читаются по первичному ключу
+        expired = (Notification
+                   .select(Notification.id)
+                   .join(Question)
+                   .where((Question.created_at < cutoff) & (Question.published_at.is_null())))
+        deleted = Notification.delete().where(Notification.id.in_(expired)).execute()
+        if deleted:
+            self.purged += deleted
+            logger.info(f"Удалено просроченных уведомлений: {deleted}")
+        return deleted
+
+    async def send_batch(self, question_ids: list[str]):
+        """Отправка уведомлений по пакету вопросов"""
+        notifications = list(Notification
+                             .select(Notification.id, Notification.chat_id, Question.id, Question.text)
+                             .join(Question)
+                             .where(Notification.question.in_(question_ids)))
+
+        done = []
+        for notification in notifications:
+            chat_id = decrypt_chat_id(notification.chat_id, self.secret)
+            if chat_id is None:
+                # Запись повреждена или зашифрована прежним секретом — отправить некуда
+                logger.warning(f"Не удалось расшифровать уведомление о вопросе {notification.question.id}")
+                self.failed += 1
+                done.append(notification.id)
+                continue
+
+            text = (
+                f"✅ Ответ на ваш вопрос «{get_preview(notification.question.text)}» "
+                "опубликован в канале @marilav_clinic"
+            )
+            try:
+                await self._send(chat_id, text)
+                self.sent += 1
+            except TelegramForbiddenError:
+                # Пользователь заблокировал бота — уведомление больше не нужно
+                self.failed += 1
+            except Exception as e:
+                # Уведомление остаётся в базе и будет отправлено после перезапуска
+                logger.error(f"Ошибка при отправке уведомления о вопросе {notification.question.id}: {e}")
+                self.failed += 1
+                continue
+
+            done.append(notification.id)
+            await asyncio.sleep(self.interval)
+
+        if done:
+            Notification.delete().where(Notification.id.in_(done)).execute()
+            logger.info(f"Отправлено уведомлений о публикации: {len(done)}")
+
+    async def _send(self, chat_id: int, text: str):
+        """Отправка сообщения с повтором после ограничения Telegram (RetryAfter)"""
+        while True:
+            try:
+                await self.bot.send_message(chat_id=chat_id, text=text)
+                return
+            except TelegramRetryAfter as e:
+                logger.warning(f"Ограничение Telegram на отправку, пауза {e.retry_after} с")
+                await asyncio.sleep(e.retry_after)
+
+    def get_stats(self) -> dict:
+        return {
+            'queued': self.queue.qsize(),
+            'sent': self.sent,
+            'failed': self.failed,
+            'purged': self.purged,
+        }
@@ -0,0 +1,138 @@
+"""
+Профилирование работающего бота по команде администратора
+
+CPU: cProfile включается на N секунд в потоке цикла событий, поэтому в профиль
+попадают все обработчики, middleware и фоновые задачи бота (кроме кода,
+выполняемого в отдельных потоках через asyncio.to_thread).
+
+Память: tracemalloc запускается по команде, сразу делает базовый снимок,
+каждый следующий снимок сравнивается с базовым — так видно, где растёт память.
+
+Пока профилирование не запущено, профилировщик ничего не стоит: cProfile и
+tracemalloc не включены, никаких хуков не установлено.
+"""
+import asyncio
+import cProfile
+import datetime
+import io
+import pstats
+import time
+import tracemalloc
+
+# Количество строк в отчётах
+TOP_LIMIT = 40
+
+# Глубина стека для мест выделения памяти
+TRACEMALLOC_FRAMES = 10
+
+# Исключение из отчёта памяти выделений самого tracemalloc и импорта модулей
+MEMORY_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+_cpu_lock = asyncio.Lock()
+_baseline: tracemalloc.Snapshot | None = None
+_baseline_at: datetime.datetime | None = None
+
+
+def is_cpu_profiling() -> bool:
+    return _cpu_lock.locked()
+
+
+def is_memory_tracing() -> bool:
+    return tracemalloc.is_tracing()
+
+
+async def profile_cpu(seconds: float) -> str:
+    """
+    Профиль CPU за seconds секунд работы бота
+    Возвращает отчёт: функции по суммарному и собственному времени
+    """
+    if _cpu_lock.locked():
+        raise RuntimeError("Профилирование CPU уже запущено")
+
+    async with _cpu_lock:
+        profile = cProfile.Profile()
+        started_at = time.perf_counter()
+        profile.enable()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profile.disable()
+        elapsed = time.perf_counter() - started_at
+
+    output = io.StringIO()
+    output.write(f"Профиль CPU: {elapsed:.1f} с, {datetime.datetime.now():%Y-%m-%d %H:%M:%S}\n\n")
+
+    stats = pstats.Stats(profile, stream=output)
+    stats.strip_dirs()
+
+    output.write(f"=== Топ {TOP_LIMIT} по суммарному времени (cumulative) ===\n")
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(TOP_LIMIT)
+
+    output.write(f"\n=== Топ {TOP_LIMIT} по собственному времени (tottime) ===\n")
+    stats.sort_stats(pstats.SortKey.TIME).print_stats(TOP_LIMIT)
+
+    return output.getvalue()
+
+
+def start_memory_tracing():
+    """Запуск tracemalloc и базовый снимок памяти"""
+    global _baseline, _baseline_at
+
+    if tracemalloc.is_tracing():
+        raise RuntimeError("Отслеживание памяти уже запущено")
+
+    tracemalloc.start(TRACEMALLOC_FRAMES)
+    _baseline = tracemalloc.take_snapshot().filter_traces(MEMORY_FILTERS)
+    _baseline_at = datetime.datetime.now()
+
+
+def take_memory_report() -> str:
+    """
+    Снимок памяти и сравнение с базовым
+    Возвращает отчёт: рост по строкам кода, стеки крупнейших источников роста
+    и крупнейшие места выделения памяти в текущем снимке
+    """
+    if not tracemalloc.is_tracing() or _baseline is None:
+        raise RuntimeError("Отслеживание памяти не запущено")
+
+    snapshot = tracemalloc.take_snapshot().filter_traces(MEMORY_FILTERS)
+    current, peak = tracemalloc.get_traced_memory()
+
+    output = io.StringIO()
+    output.write(
+        f"Снимок памяти: {datetime.datetime.now():%Y-%m-%d %H:%M:%S}, "
+        f"базовый снимок: {_baseline_at:%Y-%m-%d %H:%M:%S}\n"
+        f"Отслеживается: {current / 1024 / 1024:.1f} МБ, пик: {peak / 1024 / 1024:.1f} МБ\n\n"
+    )
+
+    diff = snapshot.compare_to(_baseline, 'lineno')
+    output.write(f"=== Топ {TOP_LIMIT} по росту памяти с базового снимка ===\n")
+    for stat in diff[:TOP_LIMIT]:
+        output.write(f"{stat}\n")
+
+    output.write("\n=== Стеки 5 крупнейших источников роста ===\n")
+    for stat in snapshot.compare_to(_baseline, 'traceback')[:5]:
+        output.write(f"\n{stat.size_diff / 1024:+.1f} КиБ, {stat.count_diff:+d} блоков\n")
+        output.write("\n".join(stat.traceback.format()) + "\n")
+
+    output.write(f"\n=== Топ {TOP_LIMIT} мест выделения памяти ===\n")
+    for stat in snapshot.statistics('lineno')[:TOP_LIMIT]:
+        output.write(f"{stat}\n")
+
+    return output.getvalue()
+
+
+def stop_memory_tracing():
+    """Остановка tracemalloc и освобождение снимков"""
+    global _baseline, _baseline_at
+
+    if not tracemalloc.is_tracing():
+        raise RuntimeError("Отслеживание памяти не запущено")
+
+    tracemalloc.stop()
+    _baseline = _baseline_at = None
@@ -0,0 +1,63 @@
+"""
+Параллельная публикация ответов в несколько каналов
+
+В каждый канал сначала отправляется видеосообщение, затем текст вопроса —
+порядок внутри канала сохраняется, а сами каналы обрабатываются параллельно
+(не более concurrency одновременно). Видео передаётся по file_id, поэтому
+файл никогда не загружается в Telegram повторно.
+"""
+import asyncio
+from dataclasses import dataclass
+
+from aiogram import Bot
+from loguru import logger
+
+
+@dataclass
+class PublishResult:
+    """Результат публикации в один канал"""
+    target: str
+    message_id: int | None = None
+    error: str | None = None
+
+    @property
+    def success(self) -> bool:
+        return self.error is None
+
+
+async def publish_to_target(bot: Bot, target: str, caption: str, video_file_id: str) -> PublishResult:
+    """Публикация видеосообщения и текста вопроса в один канал"""
+    try:
+        await bot.send_video_note(
+            chat_id=target,
+            video_note=video_file_id,
+            duration=None  # Автоматическая длительность
+        )
+
+        # Отправка текста отдельным сообщением (т.к. кружочки не поддерживают длинные подписи)
+        message = await bot.send_message(
+            chat_id=target,
+            text=caption
+        )
+
+        logger.info(f"Пост опубликован в канале {target}")
+        return PublishResult(target=target, message_id=message.message_id)
+
+    except Exception as e:
+        logger.error(f"Ошибка при публикации в канале {target}: {e}")
+        return PublishResult(target=target, error=str(e) or e.__class__.__name__)
+
+
+async def publish_to_targets(bot: Bot, targets, caption: str, video_file_id: str,
+                             concurrency: int = 5) -> list[PublishResult]:
+    """
+    Публикация во все каналы параллельно с ограничением одновременных отправок
+    Общее время близко ко времени самого медленного канала, а не к сумме
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def publish_limited(target: str) -> PublishResult:
+        async with semaphore:
+            return await publish_to_target(bot, target, caption, video_file_id)
+
+    return list(await asyncio.gather(*(publish_limited(target) for target in targets)))
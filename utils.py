@@ -1,6 +1,9 @@
 """
 Утилиты для бота
 """
+import hashlib
+import hmac
+import os
 import uuid
 
 
@@ -21,6 +24,50 @@ def generate_question_id() -> str:
     return str(uuid.uuid4())
 
 
+def hash_user_id(user_id: int, secret: str) -> str:
+    """
+    Ключевой хеш ID пользователя (HMAC-SHA256, первые 128 бит)
+    Без секрета по хешу нельзя восстановить ID или проверить, принадлежит ли вопрос пользователю
+    """
+    return hmac.new(secret.encode(), str(user_id).encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def derive_key(secret: str, purpose: bytes) -> bytes:
+    """Отдельный ключ для каждого назначения, производный от секрета"""
+    return hmac.new(secret.encode(), purpose, hashlib.sha256).digest()
+
+
+def encrypt_chat_id(chat_id: int, secret: str) -> str:
+    """
+    Шифрование ID чата ключом, производным от секрета (только стандартная библиотека)
+    8 байт ID складываются по XOR с HMAC-SHA256 от случайного nonce, к результату
+    добавляется HMAC-тег: без секрета ID нельзя ни прочитать, ни подменить
+    """
+    nonce = os.urandom(16)
+    stream = hmac.new(derive_key(secret, b'chat-id-encryption'), nonce, hashlib.sha256).digest()[:8]
+    ciphertext = bytes(a ^ b for a, b in zip(chat_id.to_bytes(8, 'big', signed=True), stream))
+    tag = hmac.new(derive_key(secret, b'chat-id-authentication'), nonce + ciphertext, hashlib.sha256).digest()[:16]
+    return (nonce + ciphertext + tag).hex()
+
+
+def decrypt_chat_id(token: str, secret: str) -> int | None:
+    """Расшифровка ID чата; None, если запись повреждена или зашифрована другим секретом"""
+    try:
+        data = bytes.fromhex(token)
+    except (TypeError, ValueError):
+        return None
+    if len(data) != 40:
+        return None
+
+    nonce, ciphertext, tag = data[:16], data[16:24], data[24:]
+    expected = hmac.new(derive_key(secret, b'chat-id-authentication'), nonce + ciphertext, hashlib.sha256).digest()[:16]
+    if not hmac.compare_digest(tag, expected):
+        return None
+
+    stream = hmac.new(derive_key(secret, b'chat-id-encryption'), nonce, hashlib.sha256).digest()[:8]
+    return int.from_bytes(bytes(a ^ b for a, b in zip(ciphertext, stream)), 'big', signed=True)
+
+
 def validate_question_text(text: str, max_length: int = 1000) -> tuple[bool, str]:
     """
     Валидация текста вопроса
@@ -34,3 +81,18 @@ def validate_question_text(text: str, max_length: int = 1000) -> tuple[bool, str
         return False, f"Вопрос слишком длинный. Максимум {max_length} символов"
 
     return True, ""
+
+
+def format_duration(seconds) -> str:
+    """Форматирование длительности в человекочитаемый вид"""
+    if seconds is None:
+        return "—"
+
+    seconds = int(seconds)
+    hours, remainder = divmod(seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    if hours:
+        return f"{hours} ч {minutes} мин"
+    if minutes:
+        return f"{minutes} мин {seconds} с"
+    return f"{seconds} с"